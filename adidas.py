@@ -1,9 +1,35 @@
 import requests
 from bs4 import BeautifulSoup
+import argparse
+import asyncio
 import os
+import posixpath
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import logs
+import metrics
+import supervisor
+import transport
+import writers
+from ratelimit import backoff_delay
+from listing import (PARSERS, harvest_html, harvest_json, iter_listing_events, link_prefix, parse_listing,
+                     parse_listing_json)
+
+log = logs.get_logger("listings")
 
 STEP = 48
+# sz= : produits par page demandés au listing ; --page-size auto demande MAX_PAGE_SIZE et garde
+# la taille que le site renvoie vraiment
+PAGE_SIZE_PARAM = "sz"
+MAX_PAGE_SIZE = 240
+# Garde-fou du sondage sans pagination : un site qui renverrait toujours la même page
+MAX_PROBE_PAGE = 1024
+# Nouvelles demandes d'une page en échec (sonde ou parcours incrémental) avant d'abandonner :
+# une page non reçue n'est jamais prise pour une page vide
+FAILED_PAGE_RETRIES = 2
+DATA_DIR = "adidas_data"
+PAGE_DELAY = 1
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
@@ -18,6 +44,12 @@ HEADERS = {
     "Pragma": "no-cache",
     "DNT": "1",
 }
+JSON_HEADERS = dict(HEADERS, Accept="application/json")
+# API JSON appelée par le front pour remplir les pages catégorie, relative à la racine du site
+LISTING_API_PATH = "/api/plp/content-engine"
+BACKENDS = ("html", "json")
+
+harvested = None  # <- {lien: fiche} lues dans les cartes pendant le crawl, avec --harvest
 
 URL_MAP = {
     "fr": {
@@ -58,87 +90,607 @@ URL_MAP = {
     },
 }
 
-def get_soup(url, retries=3, timeout=10, backoff=2):
+def fetch_html(url, retries=3, timeout=10, backoff=2):
+    # 429/5xx, timeouts et connexions refusées sont déjà retentés par le transport : seul un
+    # corps coupé en cours de lecture est redemandé ici
+    headers = JSON_HEADERS if is_listing_api(url) else HEADERS
     for attempt in range(1, retries + 1):
         try:
-            print(f"📥 Requête vers {url} (tentative {attempt}/{retries})")
-            response = requests.get(url, headers=HEADERS, timeout=timeout)
-            response.encoding = 'utf-8'
-            return BeautifulSoup(response.text, "html.parser")
-        except requests.exceptions.ReadTimeout:
-            print(f"⏳ Timeout sur {url}, tentative {attempt}/{retries}...")
-        except requests.exceptions.ConnectionError as e:
-            print(f"⚠️ Erreur connexion sur {url} : {e}, tentative {attempt}/{retries}...")
-        if attempt < retries:
-            time.sleep(backoff * attempt)
-    print(f"❌ Échec après {retries} tentatives pour {url}")
+            log.debug("📥 Requête vers %s (tentative %s/%s)", url, attempt, retries)
+            response = transport.get_transport().get(url, cache="listing", headers=headers, timeout=timeout)
+        except requests.exceptions.ChunkedEncodingError as e:
+            log.warning("⚠️ Corps interrompu sur %s : %s, tentative %s/%s...", url, e, attempt, retries)
+            if attempt < retries:
+                time.sleep(backoff_delay(attempt, base=backoff))
+            continue
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            log.error("❌ Échec de la requête %s : %s", url, e)
+            return None
+        if response.status_code != 200:
+            # Page d'erreur ou captcha, jamais parsée
+            log.error("❌ HTTP %s sur %s", response.status_code, url)
+            return None
+        response.encoding = 'utf-8'
+        return response.text
+    log.error("❌ Échec après %s tentatives pour %s", retries, url)
     return None
 
-def get_max_pages(soup):
-    page_indicator = soup.find("div", {"class": "pagination_progress-bar__sWWOn"})
-    if page_indicator:
-        style = page_indicator.get("style", "")
-        if "--page-count" in style:
-            try:
-                return int(style.split("--page-count:")[1].split(";")[0].strip())
-            except ValueError:
+def get_soup(url, retries=3, timeout=10, backoff=2):
+    html = fetch_html(url, retries, timeout, backoff)
+    return None if html is None else BeautifulSoup(html, "html.parser")
+
+def read_listing(url, parser="regex"):
+    body = fetch_html(url)
+    if body is None:
+        return None
+    supervisor.report_progress()
+    with metrics.timer("stage_seconds", stage="listing_parse"):
+        if not is_listing_api(url):
+            harvest_listing(body, url)
+            return parse_listing(body, parser, link_prefix(url))
+        try:
+            harvest_listing(body, url)
+            return parse_listing_json(body, link_prefix(url))
+        except ValueError as e:
+            log.error("❌ Réponse JSON illisible pour %s : %s", url, e)
+            return None
+
+def harvest_listing(body, url):
+    if harvested is not None:
+        harvest = harvest_json if is_listing_api(url) else harvest_html
+        harvested.update(harvest(body, link_prefix(url)))
+
+@metrics.timed("stage_seconds", stage="listing")
+def get_listing(url, parser="regex"):
+    return read_listing(url, parser)
+
+def ok_chunks(chunks, status):
+    # S'arrête au premier morceau d'une réponse non 200 : le corps d'erreur n'est pas parsé
+    for chunk in chunks:
+        if status["code"] != 200:
+            return
+        yield chunk
+
+def kept_chunks(chunks, parts):
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+
+@metrics.timed("stage_seconds", stage="listing")
+def stream_listing(url, on_page_count=None, retries=3, timeout=10, backoff=2):
+    # Parse le corps au fil de la réception ; on_page_count est appelé dès que le
+    # --page-count est lu, avant la fin du téléchargement
+    if is_listing_api(url):
+        # Réponse JSON courte : rien à gagner à la lire au fil de l'eau
+        listing = read_listing(url)
+        if listing and listing[0] and on_page_count:
+            on_page_count(listing[0])
+        return listing
+    reported = False
+    for attempt in range(1, retries + 1):
+        try:
+            log.debug("📥 Requête vers %s (tentative %s/%s)", url, attempt, retries)
+            status = {}
+            chunks = ok_chunks(transport.get_transport().stream_text(url, cache="listing", headers=HEADERS,
+                                                                     timeout=timeout, status=status), status)
+            if harvested is not None:
+                # Les cartes sont récoltées sur le corps complet, une fois le dernier morceau reçu
+                parts = []
+                chunks = kept_chunks(chunks, parts)
+            max_pages, links = None, []
+            for event, value in iter_listing_events(chunks, link_prefix(url)):
+                if event == "link":
+                    links.append(value)
+                    continue
+                max_pages = value
+                if on_page_count and value and not reported:
+                    reported = True
+                    on_page_count(value)
+            if status.get("code") != 200:
+                log.error("❌ HTTP %s sur %s", status.get("code"), url)
                 return None
+            if harvested is not None:
+                harvest_listing("".join(parts), url)
+            supervisor.report_progress()
+            return max_pages, links
+        except requests.exceptions.ChunkedEncodingError as e:
+            # Corps coupé en cours de lecture : seul cas retenté ici, le reste l'est par le transport
+            log.warning("⚠️ Corps interrompu sur %s : %s, tentative %s/%s...", url, e, attempt, retries)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+            log.error("❌ Échec de la requête %s : %s", url, e)
+            return None
+        if attempt < retries:
+            time.sleep(backoff_delay(attempt, base=backoff))
+    log.error("❌ Échec après %s tentatives pour %s", retries, url)
     return None
 
-def extract_links(soup):
-    links = []
-    product_divs = soup.find_all("div", class_="product-card_product-card-content___bjeq")
-    for div in product_divs:
-        header = div.find("header", {"data-testid": "product-card-assets"})
-        if header:
-            a_tag = header.find("a", href=True)
-            if a_tag:
-                links.append("https://www.adidas.fr" + a_tag["href"])
-    return links
-
 def save_links_codes(links, output_path):
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    codes = [link.replace('.', '/').split('/')[-2] for link in links]
+    # links : couples (lien, code) tels que sortis du parseur de listing ; les lignes partent
+    # par lots via writers.py, vidés au plus tard en fin de run, à la sortie ou sur SIGTERM
+    writers.get_writer(output_path + "_links.txt").write_lines([link for link, _ in links])
+    writers.get_writer(output_path + "_codes.txt").write_lines([code for _, code in links])
+    if harvested is not None:
+        # Fiches récoltées à côté des codes, lues par req_adidas.py --harvested
+        products = writers.get_writer(output_path + "_products.jsonl", writers.JsonlWriter)
+        for link in dict.fromkeys(link for link, _ in links):
+            if link in harvested:
+                products.write_record(harvested[link])
+    log.info("📦 %s liens ajoutés dans %s_links.txt (doublons inclus)", len(links), output_path)
 
-    with open(output_path + "_links.txt", "a", encoding="utf-8") as f_link, \
-         open(output_path + "_codes.txt", "a", encoding="utf-8") as f_code:
-        for link, code in zip(links, codes):
-            print(f"➕ Ajout : {code}")
-            f_link.write(link + "\n")
-            f_code.write(code + "\n")
+class HostLimiter:
+    # Limite le nombre de requêtes simultanées et espace leurs départs pour un même hôte
+    def __init__(self, max_concurrency, delay):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.delay = delay
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
 
-    print(f"📦 {len(links)} liens ajoutés (doublons inclus)")
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return self
 
-def scrape_all():
-    for country, genders in URL_MAP.items():
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+def iter_categories(url_map):
+    for country, genders in url_map.items():
         for gender, categories in genders.items():
             for category, base_url in categories.items():
-                print(f"\n🚀 Scraping {country}/{gender}/{category}")
-                soup = get_soup(base_url)
-                if soup is None:
-                    print(f"⛔️ Impossible de récupérer la page {base_url}, passage à la suivante.")
-                    continue
-                max_pages = get_max_pages(soup)
+                yield country, gender, category, base_url
 
-                if not max_pages:
-                    print(f"⚠️ Aucune pagination détectée pour {base_url}")
-                    continue
+def country_sites(url_map):
+    # Racine du site de chaque pays, déduite de ses listings : https://www.adidas.fr, https://www.adidas.com/us...
+    paths = {}
+    for country, _, _, base_url in iter_categories(url_map):
+        origin = link_prefix(base_url)
+        paths.setdefault((country, origin), []).append(posixpath.dirname(urlparse(base_url).path) or "/")
+    return {country: origin + posixpath.commonpath(dirs).rstrip("/") for (country, origin), dirs in paths.items()}
+
+def listing_api_url(base_url):
+    # https://www.adidas.com/us/shoes-men -> https://www.adidas.com/us/api/plp/content-engine?query=shoes-men
+    parsed = urlparse(base_url)
+    directory, slug = posixpath.split(parsed.path.rstrip("/"))
+    return f"{parsed.scheme}://{parsed.netloc}{directory.rstrip('/')}{LISTING_API_PATH}?query={slug}"
+
+def is_listing_api(url):
+    return urlparse(url).path.endswith(LISTING_API_PATH)
+
+def parse_backends(values):
+    # ["json"] : tous les pays ; ["json", "us=html"] : JSON partout sauf us
+    backends = {}
+    for value in values or []:
+        country, _, backend = value.rpartition("=")
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de listing inconnu : {value}")
+        backends[country or "*"] = backend
+    return backends
+
+def listing_url_map(url_map, backends):
+    # Les pays servis par l'API JSON crawlent les URLs de l'API à la place des pages catégorie
+    def backend_for(country):
+        return backends.get(country, backends.get("*", "html"))
+    return {
+        country: {
+            gender: {category: listing_api_url(url) if backend_for(country) == "json" else url
+                     for category, url in categories.items()}
+            for gender, categories in genders.items()
+        }
+        for country, genders in url_map.items()
+    }
+
+def adopted_page_size(listing, page_size):
+    # Page 0 plus courte que demandé mais d'au moins STEP cartes : le site plafonne sz=, les
+    # offsets start= suivent la taille réellement servie. Moins de STEP : petite catégorie
+    count = len(listing[1]) if listing else 0
+    return count if STEP <= count < page_size else page_size
+
+def page_url(base_url, start, sort=None, size=STEP):
+    params = []
+    if sort:
+        params.append(f"sort={sort}")
+    if size != STEP:
+        params.append(f"{PAGE_SIZE_PARAM}={size}")
+    if start:
+        params.append(f"start={start}")
+    if not params:
+        return base_url
+    return f"{base_url}{'&' if '?' in base_url else '?'}{'&'.join(params)}"
+
+class PagePlan:
+    # Pages d'une catégorie. La page 0 déjà reçue n'est pas redemandée ; son --page-count (ou le
+    # total de l'API JSON) donne le nombre de pages. Sans lui, une page 0 pleine fait sonder
+    # ?start= aux pages 1, 2, 4, 8... jusqu'à une page vide, puis par dichotomie entre la
+    # dernière page pleine et la première vide : O(log n) requêtes
+    def __init__(self, base_url, first, max_pages=None, page_size=STEP):
+        self.base_url = base_url
+        self.page_size = adopted_page_size(first, page_size)
+        if self.page_size != page_size:
+            log.info("📏 %s : %s produits par page servis pour %s demandés", base_url, self.page_size, page_size)
+        self.listings = {0: first}
+        self.max_pages = max_pages
+        self.last_full = 0
+        self.first_empty = None
+        self.probes = 0
+        self.failures = {}
+        self.failed = False
+        if max_pages is None:
+            self.feed(0, first)
+
+    def url(self, page):
+        return page_url(self.base_url, page * self.page_size, size=self.page_size)
+
+    def feed(self, page, listing):
+        self.listings[page] = listing
+        if self.max_pages is not None:
+            return
+        if listing is None:
+            self.failures[page] = self.failures.get(page, 0) + 1
+            return
+        self.failures.pop(page, None)
+        if listing[0]:
+            self.max_pages = listing[0]
+            return
+        links = listing[1]
+        if not links:
+            self.first_empty = page if self.first_empty is None else min(self.first_empty, page)
+        elif len(links) < self.page_size:
+            self.max_pages = page + 1
+        else:
+            self.last_full = max(self.last_full, page)
+
+    def next_probe(self):
+        # Page à sonder, None quand le nombre de pages est connu
+        if self.max_pages is not None or self.failed:
+            return None
+        if self.failures:
+            page = min(self.failures)
+            if self.failures[page] > FAILED_PAGE_RETRIES:
+                # Sans cette page le nombre de pages reste inconnu : mieux vaut rien qu'une liste tronquée
+                log.warning("⛔️ Sonde %s en échec après %s essais, catégorie ignorée", self.url(page),
+                            self.failures[page])
+                self.failed = True
+                return None
+            self.probes += 1
+            metrics.count("pagination_probes")
+            return page
+        if self.first_empty is None and self.last_full >= MAX_PROBE_PAGE:
+            log.warning("⚠️ Toujours des produits page %s de %s, sondage arrêté", self.last_full + 1, self.base_url)
+            self.max_pages = self.last_full + 1
+            return None
+        if self.first_empty is None:
+            page = max(self.last_full * 2, 1)
+        elif self.first_empty - self.last_full > 1:
+            page = (self.last_full + self.first_empty) // 2
+        else:
+            self.max_pages = self.first_empty
+            return None
+        self.probes += 1
+        metrics.count("pagination_probes")
+        return page
+
+    def remaining(self):
+        return [(page, self.url(page)) for page in range(self.max_pages or 0) if page not in self.listings]
+
+    def links(self, country, gender, category):
+        # Pages concaténées dans l'ordre pour garder la même sortie que le mode séquentiel
+        if self.failed:
+            return []
+        all_links = []
+        for page in range(self.max_pages or 0):
+            listing = self.listings.get(page)
+            if listing is None:
+                log.warning("⛔️ Impossible de récupérer la page %s, passage à la suivante.", self.url(page))
+                continue
+            log.debug("🔗 %s liens trouvés page %s/%s (%s/%s/%s)", len(listing[1]), page + 1, self.max_pages,
+                      country, gender, category)
+            if page < self.max_pages - 1 and len(listing[1]) != self.page_size:
+                # Seule la dernière page peut être incomplète : sinon des produits manquent ou se répètent
+                metrics.count("short_pages")
+                log.warning("⚠️ %s cartes au lieu de %s sur %s", len(listing[1]), self.page_size, self.url(page))
+            all_links.extend(listing[1])
+        if self.probes:
+            log.info("🔍 Pas de pagination pour %s : %s pages trouvées en %s sondages", self.base_url,
+                     self.max_pages, self.probes)
+        elif not self.max_pages:
+            log.warning("⚠️ Aucun produit pour %s", self.base_url)
+        return all_links
+
+def load_known_codes(output_base):
+    path = output_base + "_codes.txt"
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+class IncrementalCrawl:
+    # Parcourt les pages dans l'ordre et s'arrête après `stop_after` pages consécutives sans
+    # code inconnu : sur un listing trié du plus récent au plus ancien, la suite est déjà connue
+    def __init__(self, base_url, known, stop_after, sort=None, page_size=STEP):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.known = known
+        self.stop_after = stop_after
+        self.sort = sort
+        self.page = 0
+        self.max_pages = None
+        self.empty_streak = 0
+        self.new_links = []
+        self.failures = 0
+        self.done = False
+
+    def next_url(self):
+        if self.done:
+            return None
+        return page_url(self.base_url, self.page * self.page_size, self.sort, self.page_size)
+
+    def feed(self, listing):
+        if listing is None:
+            # Page redemandée au prochain next_url ; une page d'erreur n'a pas de lien et
+            # arrêterait le parcours comme une fin de listing
+            self.failures += 1
+            if self.failures > FAILED_PAGE_RETRIES:
+                log.warning("⛔️ %s en échec après %s essais, parcours incrémental arrêté", self.next_url(),
+                            self.failures)
+                self.done = True
+            return
+        self.failures = 0
+        if self.page == 0:
+            self.page_size = adopted_page_size(listing, self.page_size)
+        self.page += 1
+        max_pages, links = listing
+        self.max_pages = max_pages or self.max_pages
+        page_new = []
+        for link, code in links:
+            if code not in self.known:
+                self.known.add(code)
+                page_new.append((link, code))
+        self.new_links.extend(page_new)
+        self.empty_streak = 0 if page_new else self.empty_streak + 1
+        if self.empty_streak >= self.stop_after or not links or \
+                (self.max_pages and self.page >= self.max_pages):
+            self.done = True
+
+def finish_incremental(crawl, country, gender, category, output_base):
+    total = f"/{crawl.max_pages}" if crawl.max_pages else ""
+    log.info("🆕 %s/%s/%s : %s nouveaux codes en %s%s pages", country, gender, category, len(crawl.new_links),
+             crawl.page, total)
+    if crawl.new_links:
+        save_links_codes(crawl.new_links, output_base)
+
+def scrape_all_incremental_sync(url_map, output_dir, delay, parser, streaming, stop_after, sort, page_size):
+    for country, gender, category, base_url in iter_categories(url_map):
+        log.info("🚀 Scraping incrémental %s/%s/%s", country, gender, category)
+        output_base = f"{output_dir}/{country}/{gender}/{category}"
+        crawl = IncrementalCrawl(base_url, load_known_codes(output_base), stop_after, sort, page_size)
+        url = crawl.next_url()
+        while url:
+            crawl.feed(stream_listing(url) if streaming else get_listing(url, parser))
+            url = crawl.next_url()
+            if url:
+                time.sleep(delay)
+        finish_incremental(crawl, country, gender, category, output_base)
+
+async def scrape_category_incremental_async(country, gender, category, base_url, fetch, output_dir,
+                                            stop_after, sort, page_size):
+    log.info("🚀 Scraping incrémental %s/%s/%s", country, gender, category)
+    output_base = f"{output_dir}/{country}/{gender}/{category}"
+    crawl = IncrementalCrawl(base_url, load_known_codes(output_base), stop_after, sort, page_size)
+    url = crawl.next_url()
+    while url:
+        crawl.feed(await fetch(url))
+        url = crawl.next_url()
+    finish_incremental(crawl, country, gender, category, output_base)
+
+def scrape_all_sync(url_map, output_dir, delay, parser, streaming, page_size):
+    def fetch(url):
+        return stream_listing(url) if streaming else get_listing(url, parser)
+
+    for country, gender, category, base_url in iter_categories(url_map):
+        log.info("🚀 Scraping %s/%s/%s", country, gender, category)
+        listing = fetch(page_url(base_url, 0, size=page_size))
+        if listing is None:
+            log.warning("⛔️ Impossible de récupérer la page %s, passage à la suivante.", base_url)
+            continue
+        plan = PagePlan(base_url, listing, page_size=page_size)
+        page = plan.next_probe()
+        while page is not None:
+            time.sleep(delay)
+            plan.feed(page, fetch(plan.url(page)))
+            page = plan.next_probe()
+        for page, paged_url in plan.remaining():
+            time.sleep(delay)
+            plan.feed(page, fetch(paged_url))
+
+        output_base = f"{output_dir}/{country}/{gender}/{category}"
+        save_links_codes(plan.links(country, gender, category), output_base)
+
+async def fetch_listing_async(url, limiters, executor, max_concurrency, delay, parser, streaming,
+                              on_page_count=None):
+    host = urlparse(url).netloc
+    limiter = limiters.get(host)
+    if limiter is None:
+        limiter = limiters[host] = HostLimiter(max_concurrency, delay)
+    async with limiter:
+        loop = asyncio.get_running_loop()
+        if streaming:
+            return await loop.run_in_executor(executor, stream_listing, url, on_page_count)
+        return await loop.run_in_executor(executor, get_listing, url, parser)
+
+async def first_page_streaming(url, fetch):
+    # Renvoie le nombre de pages dès qu'il est lu, avec la tâche qui finit de télécharger la page 0
+    loop = asyncio.get_running_loop()
+    page_count = loop.create_future()
+
+    def set_page_count(value):
+        if not page_count.done():
+            page_count.set_result(value)
+
+    def on_page_count(value):
+        loop.call_soon_threadsafe(set_page_count, value)
+
+    first = asyncio.ensure_future(fetch(url, on_page_count))
+    await asyncio.wait({first, page_count}, return_when=asyncio.FIRST_COMPLETED)
+    if page_count.done():
+        return page_count.result(), first
+    listing = first.result()
+    return (None if listing is None else listing[0]), first
+
+async def scrape_category_async(country, gender, category, base_url, fetch, output_dir, streaming, page_size):
+    log.info("🚀 Scraping %s/%s/%s", country, gender, category)
+    output_base = f"{output_dir}/{country}/{gender}/{category}"
+    if streaming:
+        max_pages, first = await first_page_streaming(page_url(base_url, 0, size=page_size), fetch)
+        # Avec sz= la taille servie n'est connue qu'à la fin de la page 0
+        if max_pages and page_size == STEP:
+            # Les pages suivantes partent pendant que la page 0 finit d'arriver
+            plan = PagePlan(base_url, None, max_pages)
+            remaining = plan.remaining()
+            rest = asyncio.gather(*(fetch(url) for _, url in remaining))
+            plan.feed(0, await first)
+            for (page, _), listing in zip(remaining, await rest):
+                plan.feed(page, listing)
+            save_links_codes(plan.links(country, gender, category), output_base)
+            return
+        listing = await first
+    else:
+        listing = await fetch(page_url(base_url, 0, size=page_size))
+    if listing is None:
+        log.warning("⛔️ Impossible de récupérer la page %s, passage à la suivante.", base_url)
+        return
+
+    plan = PagePlan(base_url, listing, page_size=page_size)
+    page = plan.next_probe()
+    while page is not None:
+        plan.feed(page, await fetch(plan.url(page)))
+        page = plan.next_probe()
+    # Nombre de pages connu : toutes les pages restantes partent ensemble
+    remaining = plan.remaining()
+    for (page, _), listing in zip(remaining, await asyncio.gather(*(fetch(url) for _, url in remaining))):
+        plan.feed(page, listing)
+    save_links_codes(plan.links(country, gender, category), output_base)
+
+async def scrape_all_async(url_map, output_dir, max_concurrency, delay, parser, streaming, incremental=False,
+                           stop_after=2, sort=None, page_size=STEP):
+    hosts = {urlparse(base_url).netloc for *_, base_url in iter_categories(url_map)}
+    limiters = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency * max(len(hosts), 1)) as executor:
+        async def fetch(url, on_page_count=None):
+            return await fetch_listing_async(url, limiters, executor, max_concurrency, delay, parser,
+                                             streaming, on_page_count)
+
+        if incremental:
+            # Pages séquentielles dans une catégorie, catégories en parallèle
+            await asyncio.gather(*(
+                scrape_category_incremental_async(country, gender, category, base_url, fetch, output_dir,
+                                                  stop_after, sort, page_size)
+                for country, gender, category, base_url in iter_categories(url_map)
+            ))
+            return
+        await asyncio.gather(*(
+            scrape_category_async(country, gender, category, base_url, fetch, output_dir, streaming, page_size)
+            for country, gender, category, base_url in iter_categories(url_map)
+        ))
+
+def scrape_all(mode="sync", max_concurrency=4, delay=PAGE_DELAY, url_map=None, output_dir=DATA_DIR,
+               parser="regex", streaming=False, incremental=False, stop_after=2, sort=None, backends=None,
+               harvest=False, page_size=STEP):
+    global harvested
+    url_map = URL_MAP if url_map is None else url_map
+    harvested = {} if harvest else None
+    if backends:
+        url_map = listing_url_map(url_map, backends)
+    if parser not in PARSERS:
+        raise ValueError(f"Parseur inconnu : {parser}")
+    if mode not in ("sync", "async"):
+        raise ValueError(f"Mode inconnu : {mode}")
+    try:
+        if mode == "sync" and incremental:
+            scrape_all_incremental_sync(url_map, output_dir, delay, parser, streaming, stop_after, sort, page_size)
+        elif mode == "sync":
+            scrape_all_sync(url_map, output_dir, delay, parser, streaming, page_size)
+        else:
+            asyncio.run(scrape_all_async(url_map, output_dir, max_concurrency, delay, parser, streaming,
+                                         incremental, stop_after, sort, page_size))
+    finally:
+        harvested = None
+        written = writers.close_all()
+        log.info("📝 %s lignes écrites dans %s fichiers en %s lots", sum(writer.written for writer in written),
+                 len(written), sum(writer.flushes for writer in written))
+
+def split_url_map(url_map, split):
+    # Découpe le catalogue en sous-catalogues indépendants, un par process worker
+    jobs = []
+    for country, genders in url_map.items():
+        if split == "country":
+            jobs.append((country, {country: genders}))
+            continue
+        for gender, categories in genders.items():
+            jobs.append((f"{country}-{gender}", {country: {gender: categories}}))
+    return jobs
+
+def scrape_supervised(split, transport_options, url_map=None, log_dir=supervisor.DEFAULT_LOG_DIR, **kwargs):
+    url_map = URL_MAP if url_map is None else url_map
+    jobs = [(name, dict(kwargs, url_map=subset)) for name, subset in split_url_map(url_map, split)]
+    return supervisor.run_workers("adidas", "scrape_all", jobs, transport_options, log_dir)
+
+def page_size_arg(value):
+    return MAX_PAGE_SIZE if value == "auto" else int(value)
 
-                all_links = []
-                for page in range(max_pages):
-                    start = page * STEP
-                    paged_url = base_url if start == 0 else f"{base_url}?start={start}"
-                    soup = get_soup(paged_url)
-                    if soup is None:
-                        print(f"⛔️ Impossible de récupérer la page {paged_url}, passage à la suivante.")
-                        continue
-                    page_links = extract_links(soup)
-                    print(f"🔗 {len(page_links)} liens trouvés page {page + 1}/{max_pages}")
-                    all_links.extend(page_links)
-                    time.sleep(1)
-
-                output_base = f"adidas_data/{country}/{gender}/{category}"
-                save_links_codes(all_links, output_base)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Récupère les codes produits des listings adidas")
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="requêtes simultanées maximum par hôte (mode async)")
+    parser.add_argument("--delay", type=float, default=PAGE_DELAY,
+                        help="délai de politesse entre deux requêtes vers un même hôte (secondes)")
+    parser.add_argument("--parser", choices=sorted(PARSERS), default="regex",
+                        help="regex : une passe avec une regex compilée, soup : arbre complet, "
+                             "strainer : SoupStrainer, stream : tokenizer sans arbre")
+    parser.add_argument("--streaming", action="store_true",
+                        help="parse les pages pendant leur téléchargement (tokenizer stream, ignore --parser)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="n'écrit que les codes absents de *_codes.txt et s'arrête sur les pages déjà connues")
+    parser.add_argument("--stop-after", type=int, default=2,
+                        help="pages consécutives sans nouveau code avant d'arrêter une catégorie (--incremental)")
+    parser.add_argument("--sort", default=None,
+                        help="valeur du paramètre sort= du listing, à régler sur le tri du plus récent (--incremental)")
+    parser.add_argument("--backend", nargs="+", default=None, metavar="[PAYS=]html|json",
+                        help="json : API JSON de listing au lieu des pages HTML, pour tous les pays ou "
+                             "par pays (ex. --backend json us=html) ; html par défaut")
+    parser.add_argument("--page-size", type=page_size_arg, default=STEP,
+                        help=f"produits par page demandés avec {PAGE_SIZE_PARAM}= (auto : {MAX_PAGE_SIZE}) ; si le "
+                             "site en sert moins, les offsets start= suivent la taille servie")
+    parser.add_argument("--harvest", action="store_true",
+                        help="récolte titre, prix et images des cartes dans *_products.jsonl "
+                             "(req_adidas.py --harvested évite alors l'appel API par code)")
+    parser.add_argument("--supervise", action="store_true",
+                        help="un process worker par pays (ou pays/genre), chacun avec son pool et son limiteur")
+    parser.add_argument("--split", choices=["country", "country-gender"], default="country",
+                        help="découpage du catalogue entre les process (--supervise)")
+    transport.add_arguments(parser)
+    logs.add_arguments(parser)
+    metrics.add_arguments(parser)
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    scrape_all()
+    args = parse_args()
+    logs.configure_from_args(args)
+    metrics.configure_from_args(args)
+    writers.install_signal_handlers()
+    options = dict(mode=args.mode, max_concurrency=args.max_concurrency, delay=args.delay, parser=args.parser,
+                   streaming=args.streaming, incremental=args.incremental, stop_after=args.stop_after,
+                   sort=args.sort, backends=parse_backends(args.backend), harvest=args.harvest,
+                   page_size=args.page_size)
+    if args.supervise:
+        scrape_supervised(args.split, transport.options_from_args(args, args.max_concurrency), **options)
+    else:
+        transport.configure_from_args(args, args.max_concurrency)
+        scrape_all(**options)
+        transport.get_transport().print_stats()
+    metrics.finish_from_args(args)
@@ -0,0 +1,727 @@
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows : pas de pic RSS
+    resource = None
+
+from bs4 import BeautifulSoup
+
+import adidas
+import image_profiles
+import listing
+import logs
+import metrics
+import product_store
+import req_adidas
+import transport
+import writers
+from fixtures import FixtureArchive, rewrite_url, rewrite_url_map, write_meta
+from ratelimit import AdaptiveLimiter
+from standin import IMAGE_PREFIX, StandinServer, image_bytes, listing_html, random_listing, replay_servers
+
+CATEGORY_PATHS = {
+    "mens": {
+        "shoes": "/chaussures-hommes",
+        "clothes": "/vetements-hommes",
+        "accessories": "/accessoires-hommes",
+    },
+    "womens": {
+        "shoes": "/chaussures-femmes",
+        "clothes": "/vetements-femmes",
+        "accessories": "/accessoires-femmes",
+    },
+}
+
+def standin_url_map(servers):
+    return {
+        country: {
+            gender: {category: server.base_url + path for category, path in categories.items()}
+            for gender, categories in CATEGORY_PATHS.items()
+        }
+        for country, server in servers.items()
+    }
+
+def bench_crawl(args):
+    # Un serveur par pays pour reproduire les trois hôtes adidas.fr / adidas.com / adidas.co.uk
+    with StandinServer(args.latency, args.products, bandwidth=args.bandwidth) as fr, \
+         StandinServer(args.latency, args.products, bandwidth=args.bandwidth) as us, \
+         StandinServer(args.latency, args.products, bandwidth=args.bandwidth) as uk:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        runs = [("sync", 1)] + [("async", n) for n in args.concurrency]
+        print(f"{'mode':<6} {'concurrence':>11} {'streaming':>9} {'durée (s)':>10} "
+              f"{'requêtes':>8} {'connexions':>10} {'réutilisées':>11}")
+        for mode, concurrency in runs:
+            for streaming in ([False, True] if args.streaming else [False]):
+                session = transport.configure(pool_size=concurrency)
+                with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    adidas.scrape_all(mode=mode, max_concurrency=concurrency, delay=args.delay,
+                                      url_map=url_map, output_dir=output_dir, streaming=streaming)
+                    elapsed = time.perf_counter() - started
+                stats = session.stats()
+                print(f"{mode:<6} {concurrency:>11} {'oui' if streaming else 'non':>9} {elapsed:>10.2f} "
+                      f"{stats['requests']:>8} {stats['new_connections']:>10} {stats['reused_connections']:>11}")
+
+def use_products_standin(server, workdir, codes_per_file):
+    # Redirige req_adidas vers le serveur local et un répertoire temporaire
+    base_input = Path(workdir) / "adidas_data"
+    for country in ("fr", "us", "uk"):
+        for gender in ("mens", "womens"):
+            for category in ("shoes", "clothes", "accessories"):
+                path = base_input / country / gender / f"{category}_codes.txt"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                codes = [f"{country}{gender[0]}{category[:2]}{n:04d}".upper() for n in range(codes_per_file)]
+                path.write_text("\n".join(codes) + "\n", encoding="utf-8")
+    use_products_workdir(workdir, {country: server.base_url for country in ("fr", "us", "uk")})
+
+def bench_products(args):
+    with StandinServer(args.latency, image_latency=args.image_latency) as server:
+        runs = [("sequential", None)] + [("pipeline", n) for n in args.workers]
+        print(f"{'mode':<10} {'workers':>7} {'durée (s)':>10}")
+        for mode, workers in runs:
+            transport.configure(pool_size=workers or 1)
+            with tempfile.TemporaryDirectory() as workdir:
+                use_products_standin(server, workdir, args.codes)
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    started = time.perf_counter()
+                    if mode == "sequential":
+                        req_adidas.run_all()
+                    else:
+                        req_adidas.run_pipeline(api_workers=workers, image_workers=workers,
+                                                save_workers=max(workers // 4, 1))
+                    elapsed = time.perf_counter() - started
+            print(f"{mode:<10} {workers or 1:>7} {elapsed:>10.2f}")
+
+def bench_batch(args):
+    # Appels à l'API produit : un par code vs lots de --batch-size codes, images en passthrough
+    with StandinServer(args.latency, image_latency=args.image_latency) as server:
+        print(f"{'mode':<10} {'lot':>4} {'durée (s)':>10} {'requêtes':>8} {'fiches':>7}")
+        for mode in args.modes:
+            for batch_size in args.batch_size:
+                session = transport.configure(pool_size=args.workers)
+                req_adidas.image_mode = "passthrough"
+                with tempfile.TemporaryDirectory() as workdir:
+                    use_products_standin(server, workdir, args.codes)
+                    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                        started = time.perf_counter()
+                        if mode == "sequential":
+                            req_adidas.run_all(batch_size=batch_size)
+                        else:
+                            req_adidas.run_pipeline(api_workers=args.workers, image_workers=args.workers,
+                                                    batch_size=batch_size)
+                        elapsed = time.perf_counter() - started
+                    written = sum(1 for _ in req_adidas.BASE_OUTPUT.rglob("*.json"))
+                req_adidas.image_mode = "transcode"
+                print(f"{mode:<10} {batch_size:>4} {elapsed:>10.2f} {session.stats()['requests']:>8} {written:>7}")
+
+def check_parsers(pages):
+    # Chaque parseur doit rendre exactement les (lien, code) et le nombre de pages de
+    # get_max_pages + extract_links + link_code sur l'arbre BeautifulSoup complet
+    mismatches = {name: 0 for name in listing.PARSERS}
+    for html in pages:
+        soup = BeautifulSoup(html, "html.parser")
+        expected = (listing.get_max_pages(soup),
+                    [(link, listing.link_code(link)) for link in listing.extract_links(soup)])
+        for name, parse in listing.PARSERS.items():
+            if parse(html) != expected:
+                mismatches[name] += 1
+    return mismatches
+
+def bench_logging(args):
+    # Même run produits avec la sortie redirigée vers un fichier, comme un run lancé avec > run.log
+    runs = [("debug", 1), ("debug", args.sample), ("info", 1), ("warning", 1)]
+    with StandinServer(0.0, image_latency=0.0) as server, tempfile.TemporaryDirectory() as logdir:
+        print(f"{'niveau':<8} {'échantillon':>11} {'durée (s)':>10} {'lignes':>8} {'Ko':>7}")
+        for level, sample in runs:
+            transport.configure(pool_size=args.workers)
+            req_adidas.image_mode = "passthrough"
+            log_path = Path(logdir) / f"{level}-{sample}.log"
+            with tempfile.TemporaryDirectory() as workdir, open(log_path, "w", encoding="utf-8") as log_file:
+                use_products_standin(server, workdir, args.codes)
+                with contextlib.redirect_stdout(log_file), contextlib.redirect_stderr(io.StringIO()):
+                    logs.setup(level, sample=sample)
+                    started = time.perf_counter()
+                    if args.mode == "sequential":
+                        req_adidas.run_all()
+                    else:
+                        req_adidas.run_pipeline(api_workers=args.workers, image_workers=args.workers)
+                    logs.shutdown()
+                    elapsed = time.perf_counter() - started
+            req_adidas.image_mode = "transcode"
+            lines = sum(1 for _ in open(log_path, encoding="utf-8"))
+            print(f"{level:<8} {sample:>11} {elapsed:>10.2f} {lines:>8} {log_path.stat().st_size / 1024:>7.0f}")
+
+def bench_parse(args):
+    if args.html:
+        pages = {path: Path(path).read_text(encoding="utf-8") for path in args.html}
+    else:
+        pages = {"synthétique": listing_html("/chaussures-hommes", 0, 480)}
+
+    if args.check:
+        rng = random.Random(args.seed)
+        mismatches = check_parsers([random_listing(rng) for _ in range(args.check)] + list(pages.values()))
+        print(f"🧪 {args.check} pages aléatoires + {len(pages)} page(s) : "
+              + ", ".join(f"{name} {count} écart(s)" for name, count in mismatches.items()))
+        if any(mismatches.values()):
+            sys.exit(1)
+
+    print(f"{'page':<20} {'parseur':<9} {'ms/page':>8} {'pic mémoire (Ko)':>17} {'liens':>6} {'identique':>9}")
+    for name, html in pages.items():
+        reference = listing.parse_listing_soup(html)
+        for parser_name, parse in listing.PARSERS.items():
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                result = parse(html)
+            elapsed = (time.perf_counter() - started) / args.repeat
+
+            tracemalloc.start()
+            parse(html)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{Path(name).name[:20]:<20} {parser_name:<9} {elapsed * 1000:>8.2f} {peak / 1024:>17.0f} "
+                  f"{len(result[1]):>6} {'oui' if result == reference else 'NON':>9}")
+
+def disk_usage(directory):
+    files = [path for path in Path(directory).rglob("*") if path.is_file()]
+    return len(files), sum(path.stat().st_blocks * 512 for path in files)
+
+def sample_output(index):
+    code = f"BENCH{index:05d}"
+    product = {
+        "id": code,
+        "title": f"Produit {index}",
+        "url": f"/produit/{code}.html",
+        "image": f"https://assets.adidas.com/images/w_600,f_auto,q_auto/{code}_01_standard.jpg",
+        "hoverImage": f"https://assets.adidas.com/images/w_600,f_auto,q_auto/{code}_02_standard.jpg",
+        "priceData": {"price": 100, "salePrice": 80},
+    }
+    return code, req_adidas.build_output(product, "fr", "mens", "shoes")
+
+def bench_store(args):
+    records = [sample_output(index) for index in range(args.records)]
+    backends = ["files", "jsonl"] + (["parquet"] if product_store.pa is not None else [])
+    print(f"{'stockage':<8} {'durée (s)':>10} {'fiches/s':>9} {'fichiers':>8} {'disque (Ko)':>12}")
+    for backend in backends:
+        with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+            req_adidas.BASE_OUTPUT = Path(workdir)
+            started = time.perf_counter()
+            req_adidas.open_store(backend, args.shard_size)
+            for code, output in records:
+                req_adidas.write_records(code, [("fr", "mens", output)])
+            req_adidas.close_store()
+            elapsed = time.perf_counter() - started
+            files, usage = disk_usage(workdir)
+        print(f"{backend:<8} {elapsed:>10.2f} {len(records) / elapsed:>9.0f} {files:>8} {usage / 1024:>12.0f}")
+
+def bench_images(args):
+    with StandinServer(0.0, image_size=args.size) as server:
+        urls = [f"{server.base_url}{IMAGE_PREFIX}BENCH{index:05d}.jpg" for index in range(args.images)]
+        print(f"{'mode':<12} {'durée (s)':>10} {'Mo/s':>7} {'CPU s / 1000 images':>20}")
+        for mode in ("transcode", "passthrough"):
+            transport.configure(pool_size=1)
+            req_adidas.image_mode = mode
+            with tempfile.TemporaryDirectory() as workdir, contextlib.redirect_stdout(io.StringIO()):
+                started, cpu_started = time.perf_counter(), time.process_time()
+                for index, url in enumerate(urls):
+                    local_path = f"{workdir}/{index}/main.jpg"
+                    if mode == "passthrough":
+                        req_adidas.download_image_raw(url, local_path)
+                    else:
+                        req_adidas.download_image(url, local_path)
+                elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            downloaded = len(image_bytes(args.size)) * len(urls)
+            print(f"{mode:<12} {elapsed:>10.2f} {downloaded / elapsed / 1e6:>7.1f} {cpu * 1000 / len(urls):>20.2f}")
+        req_adidas.image_mode = "transcode"
+    print("(le CPU inclut le serveur local, identique dans les deux modes)")
+
+def bench_throttle(args):
+    # Serveur qui renvoie 429 au-delà de --server-rate : limiteur fixe vs adaptatif
+    runs = [("fixe", None), ("adaptatif", AdaptiveLimiter(args.initial_rate, max_rate=args.server_rate * 4))]
+    print(f"{'limiteur':<10} {'durée (s)':>10} {'ok':>5} {'429 serveur':>11} {'essais':>7} {'débit final':>12}")
+    failed = []
+    for name, limiter in runs:
+        with StandinServer(0.005, max_rate=args.server_rate, retry_after=args.retry_after) as server:
+            session = transport.configure(pool_size=args.workers, limiter=limiter)
+            urls = [f"{server.base_url}/plp-app/api/product/T{index:05d}" for index in range(args.requests)]
+            with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(args.workers) as executor:
+                started = time.perf_counter()
+                statuses = list(executor.map(lambda url: session.get(url, timeout=10).status_code, urls))
+                elapsed = time.perf_counter() - started
+            final_rate = next(iter(limiter.stats().values()))["rate"] if limiter else "-"
+            print(f"{name:<10} {elapsed:>10.2f} {statuses.count(200):>5} {server.rejected:>11} "
+                  f"{session.retried:>7} {final_rate:>12}")
+            # Le limiteur adaptatif doit obtenir toutes les réponses, le fixe sert de comparaison
+            if limiter and statuses.count(200) != len(statuses):
+                failed.append(len(statuses) - statuses.count(200))
+    if failed:
+        print(f"❌ limiteur adaptatif : {failed[0]} requêtes sans réponse 200")
+        sys.exit(1)
+
+def bench_incremental(args):
+    # Crawl complet puis rafraîchissement après l'arrivée de --added produits en tête de listing
+    servers = [StandinServer(args.latency, args.products, newest_first=True) for _ in range(3)]
+    with servers[0] as fr, servers[1] as us, servers[2] as uk, tempfile.TemporaryDirectory() as output_dir:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        print(f"{'run':<22} {'durée (s)':>10} {'requêtes':>8} {'codes écrits':>12}")
+        runs = [("complet", False, 0), ("complet (refresh)", False, args.added),
+                ("incrémental", True, args.added)]
+        for name, incremental, added in runs:
+            for server in servers:
+                server.total_products = args.products + added
+            with tempfile.TemporaryDirectory() as run_dir:
+                target = output_dir if incremental or added == 0 else run_dir
+                before = sum(1 for path in Path(target).rglob("*_codes.txt") for _ in open(path))
+                session = transport.configure(pool_size=4)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    started = time.perf_counter()
+                    adidas.scrape_all(mode="async", delay=0, url_map=url_map, output_dir=target,
+                                      parser="stream", incremental=incremental, stop_after=args.stop_after)
+                    elapsed = time.perf_counter() - started
+                after = sum(1 for path in Path(target).rglob("*_codes.txt") for _ in open(path))
+            print(f"{name:<22} {elapsed:>10.2f} {session.stats()['requests']:>8} {after - before:>12}")
+
+def bench_supervise(args):
+    # Même crawl : un seul process async vs un process par pays (ou pays/genre), parse compris
+    servers = [StandinServer(args.latency, args.products) for _ in range(3)]
+    with servers[0] as fr, servers[1] as us, servers[2] as uk:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        print(f"{'run':<24} {'durée (s)':>10} {'requêtes':>8} {'codes':>7}")
+        for split in [None] + args.split:
+            with tempfile.TemporaryDirectory() as output_dir:
+                options = dict(mode="async", max_concurrency=args.concurrency, delay=0, url_map=url_map,
+                               output_dir=output_dir, parser=args.parser)
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    started = time.perf_counter()
+                    if split is None:
+                        session = transport.configure(pool_size=args.concurrency)
+                        adidas.scrape_all(**options)
+                        requests_count = session.stats()["requests"]
+                    else:
+                        results = adidas.scrape_supervised(split, {"pool_size": args.concurrency},
+                                                           log_dir=Path(output_dir) / "logs", **options)
+                        requests_count = sum(r["transport"].get("requests", 0) for r in results.values())
+                    elapsed = time.perf_counter() - started
+                codes = sum(1 for path in Path(output_dir).rglob("*_codes.txt") for _ in open(path))
+            name = "1 process" if split is None else f"supervisé ({split})"
+            print(f"{name:<24} {elapsed:>10.2f} {requests_count:>8} {codes:>7}")
+
+def crawl_output(output_dir):
+    return {path.relative_to(output_dir): path.read_text(encoding="utf-8")
+            for path in sorted(Path(output_dir).rglob("*.txt"))}
+
+def bench_listing_api(args):
+    # Même catalogue lu par les pages HTML (un parseur par ligne) puis par l'API JSON de listing
+    servers = [StandinServer(args.latency, args.products, bandwidth=args.bandwidth) for _ in range(3)]
+    with servers[0] as fr, servers[1] as us, servers[2] as uk:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        print(f"{'backend':<14} {'durée (s)':>10} {'requêtes':>8} {'Ko reçus':>9} {'Ko/48 produits':>15} "
+              f"{'ms/48 produits':>15} {'identique':>9}")
+        reference = None
+        for backend, parser in [("html", name) for name in args.parsers] + [("json", "regex")]:
+            metrics.reset()
+            session = transport.configure(pool_size=args.concurrency)
+            with tempfile.TemporaryDirectory() as output_dir:
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    started = time.perf_counter()
+                    adidas.scrape_all(mode="async", max_concurrency=args.concurrency, delay=0, url_map=url_map,
+                                      output_dir=output_dir, parser=parser, backends={"*": backend})
+                    elapsed = time.perf_counter() - started
+                output = crawl_output(output_dir)
+            reference = output if reference is None else reference
+            received = sum(entry["value"] for entry in metrics.registry.summary()["counters"]
+                            if entry["name"] == "http_bytes")
+            products = sum(text.count("\n") for path, text in output.items() if path.name.endswith("_codes.txt"))
+            blocks = max(products / 48, 1)
+            name = f"{backend} ({parser})" if backend == "html" else backend
+            print(f"{name:<14} {elapsed:>10.2f} {session.stats()['requests']:>8} {received / 1024:>9.0f} "
+                  f"{received / 1024 / blocks:>15.1f} {elapsed * 1000 / blocks:>15.1f} "
+                  f"{'oui' if output == reference else 'NON':>9}")
+
+def product_outputs(output_dir):
+    return {path.relative_to(output_dir): path.read_text(encoding="utf-8")
+            for path in sorted(Path(output_dir).rglob("*.json")) if "images" not in path.parts}
+
+def bench_harvest(args):
+    # Crawl avec récolte des cartes, puis fiches par l'API produit vs par les fiches récoltées
+    servers = [StandinServer(args.latency, args.products, image_latency=0.0) for _ in range(3)]
+    with servers[0] as fr, servers[1] as us, servers[2] as uk, tempfile.TemporaryDirectory() as workdir:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        print(f"{'listing':<8} {'fiches via':<10} {'durée (s)':>10} {'appels API':>10} {'requêtes':>8} "
+              f"{'fiches':>7} {'identique':>9}")
+        for backend in args.backends:
+            shutil.rmtree(Path(workdir) / "adidas_data", ignore_errors=True)
+            transport.configure(pool_size=args.workers)
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                adidas.scrape_all(mode="async", max_concurrency=args.workers, delay=0, url_map=url_map,
+                                  output_dir=f"{workdir}/adidas_data", backends={"*": backend}, harvest=True)
+            reference = None
+            for harvested in (False, True):
+                metrics.reset()
+                session = transport.configure(pool_size=args.workers)
+                use_products_workdir(workdir, adidas.country_sites(url_map))
+                shutil.rmtree(req_adidas.BASE_OUTPUT, ignore_errors=True)
+                req_adidas.image_mode = "passthrough"
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    started = time.perf_counter()
+                    req_adidas.run_pipeline(api_workers=args.workers, image_workers=args.workers,
+                                            harvested=harvested)
+                    elapsed = time.perf_counter() - started
+                req_adidas.image_mode = "transcode"
+                api_calls = sum(entry["count"] for entry in metrics.registry.summary()["histograms"]
+                                if entry["name"] == "stage_seconds" and entry.get("stage") == "product_api")
+                outputs = product_outputs(req_adidas.BASE_OUTPUT)
+                reference = outputs if reference is None else reference
+                print(f"{backend:<8} {'listing' if harvested else 'API':<10} {elapsed:>10.2f} {api_calls:>10} "
+                      f"{session.stats()['requests']:>8} {len(outputs):>7} {'oui' if outputs == reference else 'NON':>9}")
+
+def bench_pages(args):
+    # Requêtes par catégorie : page 0 réutilisée, sondage ?start= quand la pagination manque
+    print(f"{'produits':>8} {'pagination':>10} {'mode':<6} {'pages':>5} {'requêtes/cat.':>13} {'sondages':>8} "
+          f"{'durée (s)':>10} {'identique':>9}")
+    for products in args.products:
+        reference = None
+        for pagination in (True, False):
+            servers = [StandinServer(args.latency, products, pagination=pagination) for _ in range(3)]
+            with servers[0] as fr, servers[1] as us, servers[2] as uk:
+                url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+                categories = sum(1 for _ in adidas.iter_categories(url_map))
+                for mode in args.modes:
+                    metrics.reset()
+                    session = transport.configure(pool_size=args.concurrency)
+                    with tempfile.TemporaryDirectory() as output_dir:
+                        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                            started = time.perf_counter()
+                            adidas.scrape_all(mode=mode, max_concurrency=args.concurrency, delay=0,
+                                              url_map=url_map, output_dir=output_dir)
+                            elapsed = time.perf_counter() - started
+                        # Les liens contiennent le port du serveur : seuls les codes sont comparés
+                        output = {path: text for path, text in crawl_output(output_dir).items()
+                                  if path.name.endswith("_codes.txt")}
+                    reference = output if reference is None else reference
+                    probes = sum(entry["value"] for entry in metrics.registry.summary()["counters"]
+                                 if entry["name"] == "pagination_probes")
+                    print(f"{products:>8} {'oui' if pagination else 'non':>10} {mode:<6} "
+                          f"{-(-products // adidas.STEP):>5} {session.stats()['requests'] / categories:>13.1f} "
+                          f"{probes / categories:>8.1f} {elapsed:>10.2f} {'oui' if output == reference else 'NON':>9}")
+
+def bench_page_size(args):
+    # sz= demandé face à des stand-ins qui le plafonnent plus ou moins : requêtes par catégorie et
+    # codes identiques à ceux du crawl par pages de STEP
+    print(f"{'sz max':>6} {'sz demandé':>10} {'pagination':>10} {'requêtes/cat.':>13} {'pages courtes':>13} "
+          f"{'durée (s)':>10} {'identique':>9}")
+    mismatches = 0
+    for max_page_size in args.server_sizes:
+        for pagination in (True, False):
+            reference = None
+            servers = [StandinServer(args.latency, args.products, pagination=pagination,
+                                     max_page_size=max_page_size) for _ in range(3)]
+            with servers[0] as fr, servers[1] as us, servers[2] as uk:
+                url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+                categories = sum(1 for _ in adidas.iter_categories(url_map))
+                for page_size in [adidas.STEP] + [size for size in args.sizes if size != adidas.STEP]:
+                    metrics.reset()
+                    session = transport.configure(pool_size=args.concurrency)
+                    with tempfile.TemporaryDirectory() as output_dir:
+                        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                            started = time.perf_counter()
+                            adidas.scrape_all(mode=args.mode, max_concurrency=args.concurrency, delay=0,
+                                              url_map=url_map, output_dir=output_dir, page_size=page_size)
+                            elapsed = time.perf_counter() - started
+                        output = {path: text for path, text in crawl_output(output_dir).items()
+                                  if path.name.endswith("_codes.txt")}
+                    reference = output if reference is None else reference
+                    short_pages = sum(entry["value"] for entry in metrics.registry.summary()["counters"]
+                                      if entry["name"] == "short_pages")
+                    print(f"{max_page_size:>6} {page_size:>10} {'oui' if pagination else 'non':>10} "
+                          f"{session.stats()['requests'] / categories:>13.1f} {short_pages:>13} {elapsed:>10.2f} "
+                          f"{'oui' if output == reference else 'NON':>9}")
+                    mismatches += output != reference
+    if mismatches:
+        sys.exit(1)
+
+def bench_image_profiles(args):
+    # Rendus demandés au CDN : octets d'images reçus et économies mesurées sur l'échantillon
+    print(f"{'profil':<7} {'mode':<12} {'durée (s)':>10} {'images':>7} {'Mo images':>10} {'Mo économisés':>14} "
+          f"{'requêtes':>8}")
+    with StandinServer(args.latency, image_size=args.size) as server:
+        for profile in args.profiles:
+            for mode in args.image_modes:
+                metrics.reset()
+                session = transport.configure(pool_size=args.workers)
+                req_adidas.image_mode, req_adidas.image_profile = mode, profile
+                req_adidas.image_sample_every = args.sample
+                with tempfile.TemporaryDirectory() as workdir:
+                    use_products_standin(server, workdir, args.codes)
+                    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                        started = time.perf_counter()
+                        req_adidas.run_pipeline(api_workers=args.workers, image_workers=args.workers)
+                        elapsed = time.perf_counter() - started
+                summary = metrics.registry.summary()
+                received = sum(entry["value"] for entry in summary["counters"] if entry["name"] == "image_bytes")
+                saved = sum(entry["value"] for entry in summary["gauges"]
+                            if entry["name"] == "image_bytes_saved_estimate")
+                images = sum(entry["count"] for entry in summary["histograms"]
+                             if entry["name"] == "stage_seconds" and entry.get("stage") == "image_download")
+                print(f"{profile:<7} {mode:<12} {elapsed:>10.2f} {images:>7} {received / 1e6:>10.1f} "
+                      f"{saved / 1e6:>14.1f} {session.stats()['requests']:>8}")
+    req_adidas.image_mode, req_adidas.image_profile = "transcode", image_profiles.DEFAULT_PROFILE
+    req_adidas.image_sample_every = image_profiles.DEFAULT_SAMPLE_EVERY
+
+def record_synthetic(root, products, workers=8):
+    # Archive de démonstration : crawl puis fiches enregistrés contre trois stand-ins synthétiques
+    servers = [StandinServer(0.0, products) for _ in range(3)]
+    with servers[0] as fr, servers[1] as us, servers[2] as uk, tempfile.TemporaryDirectory() as workdir:
+        url_map = standin_url_map({"fr": fr, "us": us, "uk": uk})
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            transport.configure(pool_size=workers, record_dir=root)
+            adidas.scrape_all(mode="async", max_concurrency=workers, delay=0, url_map=url_map,
+                              output_dir=f"{workdir}/adidas_data")
+            use_products_workdir(workdir, adidas.country_sites(url_map))
+            req_adidas.run_pipeline(api_workers=workers, image_workers=workers)
+            recorded = transport.get_transport().recorder.recorded
+            transport.configure()
+        writers.flush_all()
+    write_meta(root, url_map=url_map)
+    print(f"📼 {recorded} réponses synthétiques enregistrées dans {root}")
+
+def use_products_workdir(workdir, country_sites):
+    # Codes lus dans workdir/adidas_data (sortie du crawl), sorties sous workdir/adidas_products
+    req_adidas.BASE_INPUT = Path(workdir) / "adidas_data"
+    req_adidas.BASE_OUTPUT = Path(workdir) / "adidas_products"
+    req_adidas.IMAGES_DIR = req_adidas.BASE_OUTPUT / "images"
+    req_adidas.REJECTED_LOG = str(Path(workdir) / "rejected_codes.jsonl")
+    req_adidas.COUNTRY_SITES = dict(country_sites)
+    req_adidas.country_seen_ids.clear()
+
+def replay_phase(phase, options):
+    # Lancé dans un process neuf : temps CPU et pic RSS ne comptent que le client, pas les
+    # serveurs de rejeu ni la phase précédente
+    session = transport.configure(pool_size=options["workers"])
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        started, cpu_started = time.perf_counter(), time.process_time()
+        if phase == "crawl":
+            adidas.scrape_all(mode="async", max_concurrency=options["workers"], delay=0,
+                              url_map=options["url_map"], output_dir=f"{options['workdir']}/adidas_data",
+                              parser=options["parser"])
+            items = sum(1 for path in Path(options["workdir"]).rglob("*_codes.txt") for _ in open(path))
+        else:
+            use_products_workdir(options["workdir"], options["country_sites"])
+            req_adidas.image_mode = options["image_mode"]
+            req_adidas.run_pipeline(test_mode=options["test"], api_workers=options["workers"],
+                                    image_workers=options["workers"], batch_size=options["batch_size"])
+            items = sum(1 for path in req_adidas.BASE_OUTPUT.rglob("*.json")
+                        if req_adidas.IMAGES_DIR not in path.parents)
+        elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    # Latence vue par le client jusqu'aux en-têtes, tous hôtes confondus
+    latency = metrics.Histogram()
+    for (name, labels), histogram in metrics.registry.histograms.items():
+        if name == "http_phase_seconds" and dict(labels)["phase"] == "ttfb":
+            latency.merge(histogram.counts, histogram.sum, histogram.count)
+    stats = session.stats()
+    return {
+        "elapsed": elapsed,
+        "cpu": cpu,
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+        "requests": stats["requests"],
+        "retried": stats["retried"],
+        "items": items,
+        "latency": latency.summary(),
+    }
+
+def bench_replay(args):
+    if args.synthetic:
+        record_synthetic(args.fixtures, args.products)
+    archive = FixtureArchive(args.fixtures)
+    url_map = archive.meta.get("url_map", adidas.URL_MAP)
+    context = multiprocessing.get_context("spawn")
+    with contextlib.ExitStack() as stack, tempfile.TemporaryDirectory() as workdir:
+        servers = replay_servers(archive, seed=args.seed, latency=args.latency, jitter=args.jitter,
+                                 error_rate=args.errors, error_status=args.error_status, bandwidth=args.bandwidth)
+        for server in servers.values():
+            stack.enter_context(server)
+        origins = {origin: server.base_url for origin, server in servers.items()}
+        phases = [
+            ("crawl", "codes", {"url_map": rewrite_url_map(url_map, origins), "parser": args.parser}),
+            ("products", "fiches", {"country_sites": {country: rewrite_url(site, origins)
+                                                      for country, site in adidas.country_sites(url_map).items()},
+                                    "image_mode": args.image_mode, "test": args.test,
+                                    "batch_size": args.batch_size}),
+        ]
+        print(f"{'phase':<9} {'durée (s)':>10} {'requêtes':>8} {'req/s':>7} {'éléments':>9} {'élém./s':>8} "
+              f"{'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'CPU (s)':>8} {'pic RSS (Mo)':>13} {'essais':>7}")
+        for phase, unit, options in phases:
+            options.update(workdir=workdir, workers=args.workers)
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(replay_phase, phase, options).result()
+            elapsed, latency = result["elapsed"], result["latency"]
+            rss = f"{result['rss']:.0f}" if result["rss"] is not None else "-"
+            print(f"{phase:<9} {elapsed:>10.2f} {result['requests']:>8} {result['requests'] / elapsed:>7.0f} "
+                  f"{result['items']:>9} {result['items'] / elapsed:>8.0f} "
+                  + " ".join(f"{latency.get(q, 0) * 1000:>9.1f}" for q in ("p50", "p95", "p99"))
+                  + f" {result['cpu']:>8.2f} {rss:>13} {result['retried']:>7}")
+        served = {key: sum(server.stats[key] for server in servers.values()) for key in ("requests", "errors", "missing")}
+        print(f"(éléments : {', '.join(unit for _, unit, _ in phases)} ; serveurs de rejeu : {served['requests']} "
+              f"requêtes, {served['errors']} erreurs injectées, {served['missing']} URL non enregistrées)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmarks sur un serveur HTTP local")
+    subparsers = parser.add_subparsers(dest="bench", required=True)
+
+    crawl = subparsers.add_parser("crawl", help="crawl des listings, sync vs async")
+    crawl.add_argument("--latency", type=float, default=0.05, help="latence simulée par requête (secondes)")
+    crawl.add_argument("--products", type=int, default=480, help="produits par catégorie")
+    crawl.add_argument("--delay", type=float, default=0.0, help="délai de politesse par hôte")
+    crawl.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    crawl.add_argument("--bandwidth", type=float, default=None, help="débit simulé par réponse (octets/s)")
+    crawl.add_argument("--streaming", action="store_true", help="compare aussi le parse en streaming")
+    crawl.set_defaults(func=bench_crawl)
+
+    parse = subparsers.add_parser("parse", help="parseurs de listing : temps et pic mémoire par page")
+    parse.add_argument("--html", nargs="*", help="pages de listing sauvegardées (défaut : page synthétique)")
+    parse.add_argument("--repeat", type=int, default=20)
+    parse.add_argument("--check", type=int, default=200,
+                       help="pages aléatoires comparées aux fonctions de référence (0 : aucune)")
+    parse.add_argument("--seed", type=int, default=0)
+    parse.set_defaults(func=bench_parse)
+
+    store = subparsers.add_parser("store", help="écriture des fiches : un JSON par code vs shards")
+    store.add_argument("--records", type=int, default=10000)
+    store.add_argument("--shard-size", type=int, default=product_store.DEFAULT_SHARD_SIZE)
+    store.set_defaults(func=bench_store)
+
+    images = subparsers.add_parser("images", help="images : décodage/réencodage PIL vs copie brute")
+    images.add_argument("--images", type=int, default=300)
+    images.add_argument("--size", type=int, default=600, help="côté des images servies (pixels)")
+    images.set_defaults(func=bench_images)
+
+    throttle = subparsers.add_parser("throttle", help="limiteur adaptatif face à un serveur qui renvoie 429")
+    throttle.add_argument("--requests", type=int, default=200)
+    throttle.add_argument("--workers", type=int, default=8)
+    throttle.add_argument("--server-rate", type=float, default=20, help="req/s tolérées par le serveur")
+    throttle.add_argument("--retry-after", type=int, default=1)
+    throttle.add_argument("--initial-rate", type=float, default=5.0)
+    throttle.set_defaults(func=bench_throttle)
+
+    incremental = subparsers.add_parser("incremental", help="refresh complet vs incrémental")
+    incremental.add_argument("--latency", type=float, default=0.01)
+    incremental.add_argument("--products", type=int, default=2400, help="produits par catégorie au premier crawl")
+    incremental.add_argument("--added", type=int, default=30, help="nouveaux produits par catégorie")
+    incremental.add_argument("--stop-after", type=int, default=2)
+    incremental.set_defaults(func=bench_incremental)
+
+    products = subparsers.add_parser("products", help="fiches produits, séquentiel vs pipeline")
+    products.add_argument("--latency", type=float, default=0.02, help="latence simulée de l'API produit")
+    products.add_argument("--image-latency", type=float, default=0.05, help="latence simulée du CDN images")
+    products.add_argument("--codes", type=int, default=10, help="codes par fichier *_codes.txt")
+    products.add_argument("--workers", type=int, nargs="+", default=[4, 16])
+    products.set_defaults(func=bench_products)
+
+    logging_bench = subparsers.add_parser("logging", help="run produits en sortie verbeuse vs silencieuse")
+    logging_bench.add_argument("--codes", type=int, default=100, help="codes par fichier *_codes.txt")
+    logging_bench.add_argument("--mode", choices=["sequential", "pipeline"], default="pipeline")
+    logging_bench.add_argument("--workers", type=int, default=8)
+    logging_bench.add_argument("--sample", type=int, default=100, help="échantillonnage du run debug échantillonné")
+    logging_bench.set_defaults(func=bench_logging)
+
+    batch = subparsers.add_parser("batch", help="API produit : un appel par code vs lots")
+    batch.add_argument("--latency", type=float, default=0.05, help="latence simulée de l'API produit")
+    batch.add_argument("--image-latency", type=float, default=0.0)
+    batch.add_argument("--codes", type=int, default=20, help="codes par fichier *_codes.txt")
+    batch.add_argument("--workers", type=int, default=8, help="workers api et images (pipeline)")
+    batch.add_argument("--modes", nargs="+", choices=["sequential", "pipeline"], default=["sequential", "pipeline"])
+    batch.add_argument("--batch-size", type=int, nargs="+", default=[1, 10, 50])
+    batch.set_defaults(func=bench_batch)
+
+    supervise = subparsers.add_parser("supervise", help="crawl en un process vs un process par pays")
+    supervise.add_argument("--latency", type=float, default=0.02)
+    supervise.add_argument("--products", type=int, default=2400, help="produits par catégorie")
+    supervise.add_argument("--concurrency", type=int, default=8, help="requêtes simultanées par hôte")
+    supervise.add_argument("--parser", choices=sorted(listing.PARSERS), default="soup")
+    supervise.add_argument("--split", nargs="+", choices=["country", "country-gender"],
+                           default=["country", "country-gender"])
+    supervise.set_defaults(func=bench_supervise)
+
+    listing_api = subparsers.add_parser("listing-api", help="listings : pages HTML vs API JSON de listing")
+    listing_api.add_argument("--latency", type=float, default=0.02)
+    listing_api.add_argument("--products", type=int, default=2400, help="produits par catégorie")
+    listing_api.add_argument("--concurrency", type=int, default=8, help="requêtes simultanées par hôte")
+    listing_api.add_argument("--bandwidth", type=float, default=None, help="débit simulé par réponse (octets/s)")
+    listing_api.add_argument("--parsers", nargs="+", choices=sorted(listing.PARSERS), default=["soup", "regex"])
+    listing_api.set_defaults(func=bench_listing_api)
+
+    harvest = subparsers.add_parser("harvest", help="fiches : API produit par code vs récolte sur les listings")
+    harvest.add_argument("--latency", type=float, default=0.01)
+    harvest.add_argument("--products", type=int, default=96, help="produits par catégorie")
+    harvest.add_argument("--workers", type=int, default=8)
+    harvest.add_argument("--backends", nargs="+", choices=adidas.BACKENDS, default=list(adidas.BACKENDS))
+    harvest.set_defaults(func=bench_harvest)
+
+    pages = subparsers.add_parser("pages", help="pagination : page 0 réutilisée et sondage sans --page-count")
+    pages.add_argument("--latency", type=float, default=0.02)
+    pages.add_argument("--products", type=int, nargs="+", default=[30, 48, 480, 2401], help="produits par catégorie")
+    pages.add_argument("--concurrency", type=int, default=8)
+    pages.add_argument("--modes", nargs="+", choices=["sync", "async"], default=["sync", "async"])
+    pages.set_defaults(func=bench_pages)
+
+    page_size = subparsers.add_parser("page-size", help="listings : produits par page (sz=) plafonnés par le site")
+    page_size.add_argument("--latency", type=float, default=0.02)
+    page_size.add_argument("--products", type=int, default=2401, help="produits par catégorie")
+    page_size.add_argument("--concurrency", type=int, default=8)
+    page_size.add_argument("--mode", choices=["sync", "async"], default="async")
+    page_size.add_argument("--sizes", type=adidas.page_size_arg, nargs="+", default=[96, adidas.MAX_PAGE_SIZE],
+                           help="sz= demandés en plus de STEP (auto : MAX_PAGE_SIZE)")
+    page_size.add_argument("--server-sizes", type=int, nargs="+", default=[48, 120, 240],
+                           help="sz= maximal honoré par les stand-ins")
+    page_size.set_defaults(func=bench_page_size)
+
+    profiles = subparsers.add_parser("image-profiles", help="images : rendu de l'API vs rendus thumb/medium du CDN")
+    profiles.add_argument("--latency", type=float, default=0.005)
+    profiles.add_argument("--size", type=int, default=1200, help="côté de l'image originale du stand-in (px)")
+    profiles.add_argument("--codes", type=int, default=20, help="codes par fichier")
+    profiles.add_argument("--workers", type=int, default=8)
+    profiles.add_argument("--sample", type=int, default=image_profiles.DEFAULT_SAMPLE_EVERY,
+                          help="une image sur N comparée au rendu de l'API")
+    profiles.add_argument("--profiles", nargs="+", choices=list(image_profiles.PROFILES),
+                          default=list(image_profiles.PROFILES)[::-1])
+    profiles.add_argument("--image-modes", nargs="+", choices=["transcode", "passthrough", "store"],
+                          default=["transcode", "passthrough"])
+    profiles.set_defaults(func=bench_image_profiles)
+
+    replay = subparsers.add_parser("replay", help="crawl + fiches rejoués depuis une archive de fixtures")
+    replay.add_argument("--fixtures", default="fixtures",
+                        help="archive enregistrée avec --record-fixtures (adidas.py puis req_adidas.py)")
+    replay.add_argument("--synthetic", action="store_true",
+                        help="remplit d'abord l'archive depuis le stand-in synthétique (aucun réseau)")
+    replay.add_argument("--products", type=int, default=480, help="produits par catégorie (--synthetic)")
+    replay.add_argument("--latency", type=float, default=0.02, help="latence par réponse (secondes)")
+    replay.add_argument("--jitter", type=float, default=0.01, help="gigue uniforme ± autour de la latence")
+    replay.add_argument("--errors", type=float, default=0.0, help="part des requêtes en erreur (0-1)")
+    replay.add_argument("--error-status", type=int, default=503, help="statut des erreurs (0 : connexion coupée)")
+    replay.add_argument("--bandwidth", type=float, default=None, help="débit simulé par réponse (octets/s)")
+    replay.add_argument("--seed", type=int, default=0)
+    replay.add_argument("--workers", type=int, default=8, help="concurrence par hôte / workers api et images")
+    replay.add_argument("--parser", choices=sorted(listing.PARSERS), default="regex")
+    replay.add_argument("--image-mode", choices=["transcode", "passthrough", "store"], default="transcode")
+    replay.add_argument("--batch-size", type=int, default=1, help="doit être celui de l'enregistrement")
+    replay.add_argument("--test", action="store_true", help="100 codes par fichier, comme req_adidas.py --test")
+    replay.set_defaults(func=bench_replay)
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    args.func(args)
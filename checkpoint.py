@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+import time
+
+DEFAULT_CHECKPOINT_PATH = "checkpoint.sqlite"
+# États terminaux ; les codes "failed" sont retentés à la reprise
+FINISHED_STATES = ("done", "rejected")
+# Découpage des états : un run unique journalise un code pour tous ses pays, --supervise un code par pays
+SCHEMES = {False: "run", True: "pays"}
+
+class Checkpoint:
+    # scope sépare les états quand plusieurs process se partagent le journal (un par pays) ;
+    # per_country est implicite dès qu'un scope est donné
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, reset=False, scope="", per_country=False):
+        self.path = path
+        self.scope = scope
+        self.scheme = SCHEMES[bool(scope) or per_country]
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS states (scope TEXT, code TEXT, state TEXT, detail TEXT, updated_at REAL, "
+            "PRIMARY KEY (scope, code))"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS seen_ids (country TEXT, product_id TEXT, PRIMARY KEY (country, product_id))"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if reset:
+            self.db.execute("DELETE FROM states")
+            self.db.execute("DELETE FROM seen_ids")
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'scheme'").fetchone()
+        if row and row[0] != self.scheme and self.db.execute("SELECT 1 FROM states LIMIT 1").fetchone():
+            # Les états d'un mode sont invisibles pour l'autre : reprendre ne sauterait aucun code
+            self.db.close()
+            raise ValueError(f"Journal {path} écrit par un run découpé par {row[0]}, reprise impossible par "
+                             f"{self.scheme} : relancer dans le même mode (--supervise ou non) ou sans --resume")
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES ('scheme', ?)", (self.scheme,))
+        self.db.commit()
+        placeholders = ", ".join("?" for _ in FINISHED_STATES)
+        self.finished = {
+            code for (code,) in self.db.execute(
+                f"SELECT code FROM states WHERE scope = ? AND state IN ({placeholders})", (scope,) + FINISHED_STATES
+            )
+        }
+
+    def is_finished(self, code):
+        return code in self.finished
+
+    def seen_ids(self):
+        seen = {}
+        with self.lock:
+            for country, product_id in self.db.execute("SELECT country, product_id FROM seen_ids"):
+                seen.setdefault(country, set()).add(product_id)
+        return seen
+
+    def record(self, code, state, detail="", seen=()):
+        # Les ID vus ne sont enregistrés qu'avec l'état "done" : un code interrompu
+        # avant l'écriture de son JSON ne bloque pas sa reprise comme doublon
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO states VALUES (?, ?, ?, ?, ?)",
+                            (self.scope, code, state, detail, time.time()))
+            self.db.executemany("INSERT OR IGNORE INTO seen_ids VALUES (?, ?)", list(seen))
+            self.db.commit()
+            if state in FINISHED_STATES:
+                self.finished.add(code)
+
+    def done(self, code, seen=()):
+        self.record(code, "done", seen=seen)
+
+    def rejected(self, code, detail):
+        self.record(code, "rejected", detail)
+
+    def failed(self, code, detail):
+        self.record(code, "failed", detail)
+
+    def summary(self):
+        with self.lock:
+            return dict(self.db.execute("SELECT state, COUNT(*) FROM states WHERE scope = ? GROUP BY state",
+                                        (self.scope,)))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import logs
+import writers
+
+log = logs.get_logger("fixtures")
+
+DEFAULT_FIXTURES_DIR = "fixtures"
+INDEX_NAME = "index.jsonl"
+META_NAME = "meta.json"
+# Corps dont les URLs absolues sont réécrites vers les serveurs locaux au rejeu
+TEXT_TYPES = ("text/", "application/json", "application/javascript")
+
+def url_origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def rewrite_url(url, origins):
+    # origins : origine enregistrée -> adresse du serveur de rejeu
+    origin = url_origin(url)
+    return origins[origin] + url[len(origin):] if origin in origins else url
+
+def rewrite_url_map(url_map, origins):
+    return {
+        country: {
+            gender: {category: rewrite_url(url, origins) for category, url in categories.items()}
+            for gender, categories in genders.items()
+        }
+        for country, genders in url_map.items()
+    }
+
+class FixtureRecorder:
+    # Archive : corps rangés par sha256 sous bodies/ (une image commune à trois pays n'est
+    # écrite qu'une fois), une ligne par réponse dans index.jsonl
+    def __init__(self, root=DEFAULT_FIXTURES_DIR):
+        self.root = Path(root)
+        self.bodies = self.root / "bodies"
+        self.bodies.mkdir(parents=True, exist_ok=True)
+        self.index_path = str(self.root / INDEX_NAME)
+        self.lock = threading.Lock()
+        self.recorded = 0
+
+    def record(self, url, status, headers, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.bodies / digest[:2] / digest
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".part")
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(temp_path, path)
+        # Writer repris à chaque ligne : les scripts ferment tous les writers en fin de run
+        writers.get_writer(self.index_path, writers.JsonlWriter).write_record({
+            "url": url,
+            "status": status,
+            "content_type": headers.get("Content-Type", ""),
+            "body": digest,
+            "size": len(body),
+        })
+        with self.lock:
+            self.recorded += 1
+
+def write_meta(root, **meta):
+    with open(Path(root) / META_NAME, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, ensure_ascii=False)
+
+class FixtureArchive:
+    def __init__(self, root=DEFAULT_FIXTURES_DIR):
+        self.root = Path(root)
+        index_path = self.root / INDEX_NAME
+        if not index_path.exists():
+            raise FileNotFoundError(f"Pas d'archive de fixtures dans {self.root} ({INDEX_NAME} absent)")
+        # Une URL enregistrée plusieurs fois : la dernière réponse l'emporte
+        self.entries = {}
+        with open(index_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry["url"]] = entry
+        meta_path = self.root / META_NAME
+        self.meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else {}
+        log.info("📼 %s réponses enregistrées dans %s", len(self.entries), self.root)
+
+    def origins(self):
+        return sorted({url_origin(url) for url in self.entries})
+
+    def lookup(self, url):
+        return self.entries.get(url)
+
+    def body(self, entry):
+        return (self.root / "bodies" / entry["body"][:2] / entry["body"]).read_bytes()
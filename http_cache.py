@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".http_cache.sqlite"
+DEFAULT_TTLS = {
+    "listing": 6 * 3600,
+    "product": 24 * 3600,
+    "image": 30 * 24 * 3600,
+}
+# En-têtes de requête qui changent le contenu renvoyé
+VARY_HEADERS = ("Accept", "Accept-Language")
+
+class CachedResponse:
+    # Expose le sous-ensemble de requests.Response utilisé par les scripts
+    def __init__(self, url, status_code, headers, content, from_cache=True):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = "utf-8"
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttls=None):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, kind TEXT, url TEXT, status INTEGER, headers TEXT, "
+            "body BLOB, etag TEXT, last_modified TEXT, stored_at REAL)"
+        )
+        self.db.commit()
+        self.stats = {kind: {"hit": 0, "miss": 0, "revalidated": 0} for kind in self.ttls}
+
+    @staticmethod
+    def key(url, headers):
+        headers = headers or {}
+        vary = "|".join(f"{name}={headers.get(name, '')}" for name in VARY_HEADERS)
+        return f"{url}|{vary}"
+
+    def lookup(self, url, headers, kind):
+        # Renvoie (réponse fraîche ou None, en-têtes conditionnels à envoyer)
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?",
+                (self.key(url, headers),),
+            ).fetchone()
+        if row is None:
+            return None, {}
+        status, stored_headers, body, etag, last_modified, stored_at = row
+        if time.time() - stored_at < self.ttls.get(kind, 0):
+            self.count(kind, "hit")
+            return CachedResponse(url, status, json.loads(stored_headers), body), {}
+        conditional = {}
+        if etag:
+            conditional["If-None-Match"] = etag
+        if last_modified:
+            conditional["If-Modified-Since"] = last_modified
+        return None, conditional
+
+    def cached(self, url, headers):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, headers, body FROM responses WHERE key = ?", (self.key(url, headers),)
+            ).fetchone()
+        status, stored_headers, body = row
+        return CachedResponse(url, status, json.loads(stored_headers), body)
+
+    def touch(self, url, headers, kind):
+        with self.lock:
+            self.db.execute("UPDATE responses SET stored_at = ? WHERE key = ?",
+                            (time.time(), self.key(url, headers)))
+            self.db.commit()
+        self.count(kind, "revalidated")
+        return self.cached(url, headers)
+
+    def store(self, url, headers, kind, status, response_headers, body):
+        self.count(kind, "miss")
+        if status != 200:
+            return
+        response_headers = dict(response_headers)
+        lowered = {name.lower(): value for name, value in response_headers.items()}
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.key(url, headers), kind, url, status, json.dumps(response_headers), body,
+                 lowered.get("etag"), lowered.get("last-modified"), time.time()),
+            )
+            self.db.commit()
+
+    def count(self, kind, outcome):
+        with self.lock:
+            self.stats.setdefault(kind, {"hit": 0, "miss": 0, "revalidated": 0})[outcome] += 1
+
+    def print_stats(self):
+        for kind, stats in self.stats.items():
+            if any(stats.values()):
+                print(f"🗄️ Cache {kind} : {stats['hit']} hits, {stats['revalidated']} revalidés (304), "
+                      f"{stats['miss']} miss")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,96 @@
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+import logs
+import metrics
+import transport
+
+log = logs.get_logger("images")
+
+# Segment de transformation du CDN adidas (/images/w_600,f_auto,q_auto/...) demandé à la place
+# de celui de l'API : le CDN sert directement la largeur et le format voulus. full : URL de l'API
+PROFILES = {
+    "thumb": "w_300,f_webp,q_auto",
+    "medium": "w_600,f_webp,q_auto",
+    "full": None,
+}
+DEFAULT_PROFILE = "full"
+# Une image sur N est aussi demandée dans le rendu de l'API (en-têtes seulement) pour mesurer
+# les octets économisés
+DEFAULT_SAMPLE_EVERY = 20
+# Paramètres de transformation du CDN (largeur, hauteur, recadrage, format, qualité...)
+TRANSFORM_KEYS = "w|h|c|g|f|q|fl|dpr|ar|e|b|t"
+TRANSFORM = re.compile(rf"^({TRANSFORM_KEYS})_[^,/]+(,({TRANSFORM_KEYS})_[^,/]+)*$")
+EXTENSIONS = {"webp": ".webp", "avif": ".avif", "png": ".png", "jpg": ".jpg"}
+
+def rendition_url(url, profile):
+    segment = PROFILES[profile]
+    if segment is None or not url:
+        return url
+    parts = urlsplit(url)
+    path = parts.path.split("/")
+    if "images" not in path:
+        return url
+    index = path.index("images") + 1
+    # Le dernier élément est le nom de fichier, jamais une transformation
+    if index < len(path) - 1 and TRANSFORM.match(path[index]):
+        path[index] = segment
+    else:
+        path.insert(index, segment)
+    return urlunsplit(parts._replace(path="/".join(path)))
+
+def extension(profile, default=".jpg"):
+    # Extension locale du format demandé (le mode transcode enregistre selon l'extension)
+    segment = PROFILES[profile]
+    if segment:
+        for option in segment.split(","):
+            if option.startswith("f_") and option[2:] in EXTENSIONS:
+                return EXTENSIONS[option[2:]]
+    return default
+
+def announced_size(url, headers=None):
+    # Content-Length annoncé par une requête HEAD, sans télécharger l'image
+    response = transport.get_transport().head(url, headers=headers, timeout=10)
+    length = response.headers.get("Content-Length") if response.status_code == 200 else None
+    return int(length) if length else None
+
+class ProfileMeter:
+    # Octets reçus par profil ; sur un échantillon, octets du rendu de l'API pour la même image
+    def __init__(self, profile, sample_every=DEFAULT_SAMPLE_EVERY):
+        self.profile = profile
+        self.sample_every = sample_every if PROFILES[profile] else 0
+        self.lock = threading.Lock()
+        self.images = 0
+        self.bytes = 0
+        self.sampled_bytes = 0
+        self.original_bytes = 0
+
+    def record(self, source_url, size, headers=None):
+        metrics.count("image_bytes", size, profile=self.profile)
+        with self.lock:
+            self.images += 1
+            self.bytes += size
+            sample = self.sample_every and (self.images - 1) % self.sample_every == 0
+        if not sample:
+            return
+        original = announced_size(source_url, headers)
+        if original is None:
+            return
+        metrics.count("image_bytes_saved", original - size, profile=self.profile)
+        with self.lock:
+            self.sampled_bytes += size
+            self.original_bytes += original
+
+    def report(self):
+        if not self.images:
+            return
+        if not self.sampled_bytes:
+            log.info("🖼️ Profil %s : %.1f Mo pour %s images", self.profile, self.bytes / 1e6, self.images)
+            return
+        # Économie mesurée sur l'échantillon, extrapolée à toutes les images du run
+        ratio = self.original_bytes / self.sampled_bytes
+        metrics.gauge("image_bytes_saved_estimate", round(self.bytes * (ratio - 1)), profile=self.profile)
+        log.info("🖼️ Profil %s : %.1f Mo pour %s images, %.0f%% de moins que le rendu de l'API (~%.1f Mo "
+                 "économisés)", self.profile, self.bytes / 1e6, self.images, 100 * (1 - 1 / ratio),
+                 self.bytes * (ratio - 1) / 1e6)
@@ -0,0 +1,207 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+import logs
+import transport
+
+log = logs.get_logger("images")
+
+DEFAULT_IMAGE_ROOT = Path("adidas_products") / "images"
+
+def sniff_image_type(head):
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"avif", b"avis"):
+        return ".avif"
+    return None
+
+def normalize_url(url):
+    # Le segment de transformation du CDN (w_600,f_auto...) fait partie du chemin et change
+    # le contenu : on le garde, mais on ignore la casse de l'hôte, la query et le fragment
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, "", ""))
+
+def link_or_copy(source, target):
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.exists():
+        if target.samefile(source):
+            return
+        target.unlink()
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+class ImageStore:
+    # Blobs rangés par sha256 du contenu sous blobs/ ; les chemins produits sont des liens
+    # physiques vers ces blobs. Une URL déjà connue ne coûte ni téléchargement ni écriture
+    def __init__(self, root=DEFAULT_IMAGE_ROOT):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False, timeout=30)
+        self.db.execute("CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, blob TEXT)")
+        self.db.commit()
+        self.stats = {"references": 0, "url_hits": 0, "byte_hits": 0, "downloads": 0,
+                      "bytes_downloaded": 0, "new_blobs": 0}
+
+    def blob_path(self, blob):
+        return self.blobs / blob[:2] / blob
+
+    def count(self, **increments):
+        with self.lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT blob FROM urls WHERE url = ?", (normalize_url(url),)).fetchone()
+        if row and self.blob_path(row[0]).exists():
+            return row[0]
+        return None
+
+    def remember(self, url, blob):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO urls VALUES (?, ?)", (normalize_url(url), blob))
+            self.db.commit()
+
+    def fetch(self, url, local_path, headers=None, on_download=None):
+        # Renvoie le chemin produit final (extension du format réel) ou None ; on_download
+        # reçoit la taille de chaque corps réellement téléchargé
+        blob = self.lookup(url)
+        if blob is not None:
+            self.count(references=1, url_hits=1)
+            return self.link(blob, local_path)
+
+        blob = self.download(url, headers)
+        if blob is None:
+            return None
+        if on_download:
+            on_download(self.blob_path(blob).stat().st_size)
+        self.remember(url, blob)
+        self.count(references=1)
+        return self.link(blob, local_path)
+
+    def download(self, url, headers):
+        fd, tmp_path = tempfile.mkstemp(dir=self.blobs, suffix=".part")
+        try:
+            status = {}
+            digest = hashlib.sha256()
+            extension = None
+            size = 0
+            chunks = transport.get_transport().stream(url, 65536, cache="image", status=status,
+                                                      headers=headers, timeout=10)
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    if status["code"] != 200:
+                        break
+                    if extension is None:
+                        extension = sniff_image_type(chunk[:16])
+                        if extension is None:
+                            break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            self.count(downloads=1, bytes_downloaded=size)
+            if status.get("code") != 200:
+                log.error("❌ Erreur image %s: %s", url, status.get('code'))
+                return None
+            if extension is None:
+                log.error("❌ Contenu non reconnu comme image : %s", url)
+                return None
+
+            blob = digest.hexdigest() + extension
+            target = self.blob_path(blob)
+            if target.exists():
+                # Même contenu déjà stocké sous une autre URL
+                self.count(byte_hits=1)
+                return blob
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, target)
+            self.count(new_blobs=1)
+            return blob
+        except Exception as e:
+            log.exception("❌ Exception image %s: %s", url, e)
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def link(self, blob, local_path):
+        final_path = Path(local_path).with_suffix(Path(blob).suffix)
+        link_or_copy(self.blob_path(blob), final_path)
+        log.debug("🖼️ Image liée : %s", final_path)
+        return str(final_path).replace("\\", "/")
+
+    def report(self):
+        # Références servies par blob réellement écrit pendant ce run
+        stats = dict(self.stats)
+        new_blobs = stats["new_blobs"]
+        stats["dedup_ratio"] = round(stats["references"] / new_blobs, 2) if new_blobs else None
+        return stats
+
+    def print_report(self):
+        stats = self.report()
+        ratio = f"{stats['dedup_ratio']}x" if stats["dedup_ratio"] else "n/a"
+        print(f"🧬 Images : {stats['references']} références, {stats['downloads']} téléchargements, "
+              f"{stats['url_hits']} URL déjà connues, {stats['byte_hits']} contenus identiques, "
+              f"{stats['new_blobs']} nouveaux blobs (ratio de dédup {ratio})")
+
+    def gc(self, dry_run=False):
+        # Un blob sans autre lien physique n'est plus référencé par aucun produit
+        removed = []
+        for path in self.blobs.glob("*/*"):
+            if path.is_file() and not path.name.endswith(".part") and path.stat().st_nlink == 1:
+                removed.append(path)
+        freed = sum(path.stat().st_size for path in removed)
+        if not dry_run:
+            with self.lock:
+                self.db.executemany("DELETE FROM urls WHERE blob = ?", [(path.name,) for path in removed])
+                self.db.commit()
+            for path in removed:
+                path.unlink()
+        return len(removed), freed
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+def blob_usage(store):
+    blobs = [path for path in store.blobs.glob("*/*") if path.is_file()]
+    references = sum(path.stat().st_nlink - 1 for path in blobs)
+    return len(blobs), references, sum(path.stat().st_size for path in blobs)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintenance du stockage d'images par contenu")
+    parser.add_argument("command", choices=["gc", "report"])
+    parser.add_argument("--root", default=str(DEFAULT_IMAGE_ROOT))
+    parser.add_argument("--dry-run", action="store_true", help="gc : liste sans supprimer")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = ImageStore(args.root)
+    if args.command == "gc":
+        count, freed = store.gc(args.dry_run)
+        verb = "à supprimer" if args.dry_run else "supprimés"
+        print(f"🧹 {count} blobs non référencés {verb} ({freed / 1e6:.1f} Mo)")
+    else:
+        blobs, references, size = blob_usage(store)
+        ratio = f"{references / blobs:.2f}x" if blobs else "n/a"
+        print(f"🧬 {blobs} blobs ({size / 1e6:.1f} Mo) pour {references} images produits, ratio de dédup {ratio}")
+    store.close()
@@ -0,0 +1,284 @@
+import json
+import re
+from html import unescape
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+PAGINATION_CLASS = "pagination_progress-bar__sWWOn"
+CARD_CLASS = "product-card_product-card-content___bjeq"
+CARD_HEADER_TESTID = "product-card-assets"
+NAME_CLASS = "product-card-description_name__xHvJ2"
+PRICE_CLASS = "gl-price-item"
+SALE_CLASS = "gl-price-item--sale"
+LINK_PREFIX = "https://www.adidas.fr"
+
+def link_code(link):
+    return link.replace('.', '/').split('/')[-2]
+
+def with_codes(links):
+    return [(link, link_code(link)) for link in links]
+
+def parse_page_count(style):
+    if "--page-count" in style:
+        try:
+            return int(style.split("--page-count:")[1].split(";")[0].strip())
+        except ValueError:
+            return None
+    return None
+
+def get_max_pages(soup):
+    page_indicator = soup.find("div", {"class": PAGINATION_CLASS})
+    if page_indicator:
+        return parse_page_count(page_indicator.get("style", ""))
+    return None
+
+def extract_links(soup, prefix=LINK_PREFIX):
+    links = []
+    product_divs = soup.find_all("div", class_=CARD_CLASS)
+    for div in product_divs:
+        header = div.find("header", {"data-testid": CARD_HEADER_TESTID})
+        if header:
+            a_tag = header.find("a", href=True)
+            if a_tag:
+                links.append(prefix + a_tag["href"])
+    return links
+
+def parse_listing_soup(html, prefix=LINK_PREFIX):
+    soup = BeautifulSoup(html, "html.parser")
+    return get_max_pages(soup), with_codes(extract_links(soup, prefix))
+
+# Ne construit l'arbre que pour la pagination et les cartes produits. Pendant le parse
+# l'attribut class n'est pas encore découpé, d'où la regex sur les mots
+LISTING_STRAINER = SoupStrainer(
+    "div", class_=re.compile(rf"(^|\s)({PAGINATION_CLASS}|{CARD_CLASS})(\s|$)")
+)
+
+def parse_listing_strainer(html, prefix=LINK_PREFIX):
+    soup = BeautifulSoup(html, "html.parser", parse_only=LISTING_STRAINER)
+    return get_max_pages(soup), with_codes(extract_links(soup, prefix))
+
+class ListingParser(HTMLParser):
+    # Tokenizer sans arbre : ne garde que le --page-count et le premier lien de chaque carte
+    def __init__(self, prefix=LINK_PREFIX):
+        super().__init__(convert_charrefs=True)
+        self.prefix = prefix
+        self.max_pages = None
+        self.pagination_seen = False
+        self.links = []
+        self.div_depth = 0
+        self.card_depth = None
+        self.card_done = False
+        self.in_header = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "div":
+            self.div_depth += 1
+            classes = (dict(attrs).get("class") or "").split()
+            if not self.pagination_seen and PAGINATION_CLASS in classes:
+                self.pagination_seen = True
+                self.max_pages = parse_page_count(dict(attrs).get("style") or "")
+            if self.card_depth is None and CARD_CLASS in classes:
+                self.card_depth = self.div_depth
+                self.card_done = False
+        elif self.card_depth is None or self.card_done:
+            return
+        elif tag == "header":
+            if dict(attrs).get("data-testid") == CARD_HEADER_TESTID:
+                self.in_header = True
+        elif tag == "a" and self.in_header:
+            href = dict(attrs).get("href")
+            if href is not None:
+                self.links.append(self.prefix + href)
+                self.card_done = True
+
+    def handle_endtag(self, tag):
+        if tag == "div":
+            if self.card_depth == self.div_depth:
+                self.card_depth = None
+                self.in_header = False
+            self.div_depth -= 1
+        elif tag == "header" and self.in_header:
+            # Seul le premier header de la carte compte, comme div.find("header")
+            self.in_header = False
+            self.card_done = True
+
+def parse_listing_stream(html, prefix=LINK_PREFIX):
+    parser = ListingParser(prefix)
+    parser.feed(html)
+    parser.close()
+    return parser.max_pages, with_codes(parser.links)
+
+# Une seule regex compilée, un seul parcours du HTML : chaque alternative reconnaît une balise
+# utile et un petit état suit la carte courante. La fin de la carte n'est pas suivie, un header
+# produit hors carte serait rattaché à la précédente ; les listings n'en contiennent pas
+LISTING_TOKENS = re.compile(
+    rf'<div\b[^>]*?\sclass="(?:[^"]*\s)?(?:(?P<pagination>{PAGINATION_CLASS})|(?P<card>{CARD_CLASS}))(?:\s[^"]*)?"[^>]*>'
+    rf'|(?P<header><header\b[^>]*?\sdata-testid="{CARD_HEADER_TESTID}")'
+    r'|<a\b[^>]*?\shref="(?P<href>[^"]*)"'
+    r'|(?P<header_end></header>)'
+)
+STYLE_ATTRIBUTE = re.compile(r'\sstyle="([^"]*)"')
+
+def parse_listing_regex(html, prefix=LINK_PREFIX):
+    max_pages = None
+    pagination_seen = False
+    entries = []
+    in_card = in_header = False
+    for match in LISTING_TOKENS.finditer(html):
+        kind = match.lastgroup
+        if kind == "pagination":
+            if not pagination_seen:
+                pagination_seen = True
+                style = STYLE_ATTRIBUTE.search(match.group())
+                max_pages = parse_page_count(unescape(style.group(1)) if style else "")
+        elif kind == "card":
+            in_card, in_header = True, False
+        elif not in_card:
+            continue
+        elif kind == "header":
+            in_header = True
+        elif kind == "href" and in_header:
+            href = match.group("href")
+            link = prefix + (unescape(href) if "&" in href else href)
+            entries.append((link, link_code(link)))
+            in_card = in_header = False
+        elif kind == "header_end" and in_header:
+            # Seul le premier header de la carte compte, comme div.find("header")
+            in_card = in_header = False
+    return max_pages, entries
+
+def iter_listing_events(chunks, prefix=LINK_PREFIX):
+    # Alimente le tokenizer morceau par morceau et émet ("page_count", n) puis ("link", (url, code))
+    # dès qu'ils apparaissent, sans attendre la fin du corps
+    parser = ListingParser(prefix)
+    emitted = 0
+    pagination_reported = False
+    for chunk in chunks:
+        parser.feed(chunk)
+        if not pagination_reported and parser.pagination_seen:
+            pagination_reported = True
+            yield "page_count", parser.max_pages
+        while emitted < len(parser.links):
+            yield "link", (parser.links[emitted], link_code(parser.links[emitted]))
+            emitted += 1
+    parser.close()
+    if not pagination_reported:
+        yield "page_count", parser.max_pages
+    while emitted < len(parser.links):
+        yield "link", (parser.links[emitted], link_code(parser.links[emitted]))
+        emitted += 1
+
+PARSERS = {
+    "soup": parse_listing_soup,
+    "strainer": parse_listing_strainer,
+    "stream": parse_listing_stream,
+    "regex": parse_listing_regex,
+}
+
+def parse_listing_json(body, prefix=LINK_PREFIX):
+    # Réponse de l'API de listing : raw.itemList.{count, viewSize, items[{productId, link...}]}.
+    # Le nombre de pages se déduit du total, comme le --page-count du HTML
+    item_list = json.loads(body).get("raw", {}).get("itemList", {})
+    count, view_size = item_list.get("count"), item_list.get("viewSize")
+    max_pages = -(-count // view_size) if count and view_size else None
+    entries = []
+    for item in item_list.get("items", []):
+        link = item.get("link")
+        if link:
+            link = link if link.startswith("http") else prefix + link
+            entries.append((link, link_code(link)))
+    return max_pages, entries
+
+# Récolte des fiches : chaque carte va de son div jusqu'au div de la carte suivante
+CARD_START = re.compile(rf'<div\b[^>]*?\sclass="(?:[^"]*\s)?{CARD_CLASS}(?:\s[^"]*)?"')
+CARD_HEADER = re.compile(rf'<header\b[^>]*?\sdata-testid="{CARD_HEADER_TESTID}"[^>]*>')
+CARD_HREF = re.compile(r'<a\b[^>]*?\shref="([^"]*)"')
+CARD_IMAGE = re.compile(r'<img\b[^>]*?\ssrc="([^"]*)"')
+CARD_NAME = re.compile(rf'<p\b[^>]*?\sclass="(?:[^"]*\s)?{NAME_CLASS}(?:\s[^"]*)?"[^>]*>(.*?)</p>', re.S)
+CARD_SPAN = re.compile(r'<span\b[^>]*?\sclass="([^"]*)"[^>]*>(.*?)</span>', re.S)
+TAGS = re.compile(r"<[^>]+>")
+
+def parse_price(text):
+    # "1 299,00 €", "$1,299.00", "£80" -> 1299 / 80 ; le dernier séparateur suivi de 3 chiffres
+    # est un séparateur de milliers
+    digits = re.sub(r"[^\d,.]", "", unescape(text))
+    separators = [char for char in digits if char in ",."]
+    if separators:
+        last = separators[-1]
+        decimals = digits.rsplit(last, 1)[1]
+        if len(set(separators)) == 1 and (len(separators) > 1 or len(decimals) == 3):
+            digits = digits.replace(last, "")
+        else:
+            digits = digits.replace("." if last == "," else ",", "").replace(",", ".")
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+def harvested_product(link, title, prices, images):
+    # Même forme que la fiche de l'API produit, sans les champs absents du listing
+    product = {
+        "id": link_code(link),
+        "title": title,
+        "url": urlparse(link).path,
+        "priceData": prices,
+        "image": images[0] if images else None,
+        "hoverImage": images[1] if len(images) > 1 else None,
+    }
+    return {key: value for key, value in product.items() if value}
+
+def harvest_html(html, prefix=LINK_PREFIX):
+    # Fiches lues dans les cartes (titre, prix, prix soldé, images), indexées par lien produit
+    products = {}
+    starts = [match.start() for match in CARD_START.finditer(html)] + [len(html)]
+    for start, end in zip(starts, starts[1:]):
+        card = html[start:end]
+        header = CARD_HEADER.search(card)
+        if not header:
+            continue
+        header_end = card.find("</header>", header.end())
+        header_end = len(card) if header_end == -1 else header_end
+        assets = card[header.end():header_end]
+        href = CARD_HREF.search(assets)
+        if not href:
+            continue
+        link = prefix + unescape(href.group(1))
+        images = [urljoin(prefix + "/", unescape(src)) for src in CARD_IMAGE.findall(assets)]
+        description = card[header_end:]
+        name = CARD_NAME.search(description)
+        prices = {}
+        for classes, text in CARD_SPAN.findall(description):
+            classes = classes.split()
+            if PRICE_CLASS not in classes:
+                continue
+            key = "salePrice" if SALE_CLASS in classes else "price"
+            value = parse_price(TAGS.sub("", text))
+            if value is not None and key not in prices:
+                prices[key] = value
+        title = unescape(TAGS.sub("", name.group(1))).strip() if name else None
+        products[link] = harvested_product(link, title, prices, images)
+    return products
+
+def harvest_json(body, prefix=LINK_PREFIX):
+    products = {}
+    for item in json.loads(body).get("raw", {}).get("itemList", {}).get("items", []):
+        link = item.get("link")
+        if not link:
+            continue
+        link = link if link.startswith("http") else prefix + link
+        prices = {key: item[key] for key in ("price", "salePrice") if item.get(key) is not None}
+        images = [urljoin(prefix + "/", item[key]["src"]) for key in ("image", "secondImage")
+                  if (item.get(key) or {}).get("src")]
+        products[link] = harvested_product(link, item.get("displayName"), prices, images)
+    return products
+
+def link_prefix(url):
+    # Les href des cartes sont relatifs : on les rattache à l'hôte du listing (adidas.fr, adidas.com...)
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def parse_listing(html, parser="soup", prefix=LINK_PREFIX):
+    return PARSERS[parser](html, prefix)
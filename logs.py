@@ -0,0 +1,97 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from tqdm import tqdm
+
+LOGGER_NAME = "adidas"
+LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+# info : étapes, résumés et erreurs ; les événements par code, lien ou image sont en debug
+DEFAULT_LEVEL = "info"
+FILE_FORMAT = "%(asctime)s %(levelname)s %(name)s %(threadName)s %(message)s"
+
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+class TqdmHandler(logging.Handler):
+    # Écrit au-dessus des barres tqdm au lieu de les casser ; sys.stdout est relu à chaque
+    # ligne pour suivre les redirections (journaux des process workers)
+    def emit(self, record):
+        try:
+            tqdm.write(self.format(record), file=sys.stdout)
+        except Exception:
+            self.handleError(record)
+
+class SampleFilter(logging.Filter):
+    # Ne laisse passer qu'un message debug sur `every` pour chaque gabarit
+    def __init__(self, every=1):
+        super().__init__()
+        self.every = every
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if self.every <= 1 or record.levelno > logging.DEBUG:
+            return True
+        with self.lock:
+            count = self.counts.get(record.msg, 0)
+            self.counts[record.msg] = count + 1
+        return count % self.every == 0
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler formate le message dans le thread appelant ; ici le record part tel quel,
+    # formatage et écriture se font dans le thread du QueueListener
+    def prepare(self, record):
+        return record
+
+_listener = None
+_options = {}
+
+def setup(level=DEFAULT_LEVEL, log_file=None, sample=1):
+    global _listener, _options
+    shutdown()
+    _options = {"level": level, "log_file": log_file, "sample": sample}
+    console = TqdmHandler()
+    console.setFormatter(logging.Formatter("%(message)s"))
+    handlers = [console]
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter(FILE_FORMAT))
+        handlers.append(file_handler)
+    records = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(records)
+    queue_handler.addFilter(SampleFilter(sample))
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers[:] = [queue_handler]
+    logger.setLevel(LEVELS[level])
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    _listener.start()
+
+def shutdown():
+    # Vide la file avant de rendre la main
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def options():
+    return dict(_options)
+
+def add_arguments(parser):
+    group = parser.add_argument_group("journalisation")
+    group.add_argument("--log-level", choices=sorted(LEVELS), default=DEFAULT_LEVEL,
+                       help="debug affiche chaque code, lien et image ; info seulement les étapes et résumés")
+    group.add_argument("-v", "--verbose", dest="log_level", action="store_const", const="debug")
+    group.add_argument("-q", "--quiet", dest="log_level", action="store_const", const="warning")
+    group.add_argument("--log-file", default=None, help="copie horodatée du journal dans ce fichier")
+    group.add_argument("--log-sample", type=int, default=1,
+                       help="ne garde qu'un message debug sur N pour chaque type de message")
+
+def configure_from_args(args):
+    setup(args.log_level, args.log_file, args.log_sample)
+
+atexit.register(shutdown)
@@ -0,0 +1,246 @@
+import bisect
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import logs
+
+log = logs.get_logger("metrics")
+
+DEFAULT_METRICS_PATH = "metrics.json"
+PREFIX = "adidas_"
+# Bornes hautes des buckets (secondes), de 0,5 ms à ~2 min par pas de x1,5
+BUCKETS = tuple(round(0.0005 * 1.5 ** n, 6) for n in range(31))
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts, total, count):
+        for index, value in enumerate(counts):
+            self.counts[index] += value
+        self.sum += total
+        self.count += count
+
+    def percentile(self, q):
+        # Interpolation linéaire dans le bucket qui contient le rang demandé
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else BUCKETS[-1] * 1.5
+                return lower + (upper - lower) * (rank - seen) / value
+            seen += value
+        return BUCKETS[-1]
+
+    def summary(self):
+        percentiles = {f"p{int(q * 100)}": self.percentile(q) for q in (0.5, 0.95, 0.99)}
+        return dict({key: round(value, 6) for key, value in percentiles.items() if value is not None},
+                    count=self.count, sum=round(self.sum, 6),
+                    mean=round(self.sum / self.count, 6) if self.count else None)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Registry:
+    # Compteurs, jauges et histogrammes indexés par (nom, labels triés)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.perf_counter()
+        self.cpu_started = time.process_time()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def update_process(self):
+        # Temps CPU vs temps mur : un ratio proche de 1 par cœur indique un run limité par le CPU
+        self.gauge("wall_seconds", time.perf_counter() - self.started)
+        self.gauge("cpu_seconds", time.process_time() - self.cpu_started)
+
+    def snapshot(self):
+        # Forme sérialisable, fusionnable avec merge() (process workers du superviseur)
+        self.update_process()
+        with self.lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, dict(labels), value] for (name, labels), value in self.gauges.items()],
+                "histograms": [[name, dict(labels), list(h.counts), h.sum, h.count]
+                               for (name, labels), h in self.histograms.items()],
+            }
+
+    def merge(self, snapshot, worker=None):
+        # Compteurs et histogrammes s'additionnent ; les jauges (temps CPU...) restent par worker
+        with self.lock:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                self.counters[key] = self.counters.get(key, 0) + value
+            for name, labels, value in snapshot["gauges"]:
+                if worker is not None:
+                    labels = dict(labels, worker=worker)
+                self.gauges[(name, tuple(sorted(labels.items())))] = value
+            for name, labels, counts, total, count in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.merge(counts, total, count)
+
+    def summary(self):
+        self.update_process()
+        with self.lock:
+            return {
+                "counters": [dict(labels, name=name, value=value)
+                             for (name, labels), value in sorted(self.counters.items())],
+                "gauges": [dict(labels, name=name, value=round(value, 3))
+                           for (name, labels), value in sorted(self.gauges.items())],
+                "histograms": [dict(labels, name=name, **histogram.summary())
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def prometheus_text(self):
+        self.update_process()
+        lines = []
+
+        def label_text(labels, **extra):
+            items = list(labels) + list(extra.items())
+            if not items:
+                return ""
+            return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in items) + "}"
+
+        with self.lock:
+            for kind, series in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({name for name, _ in series}):
+                    suffix = "_total" if kind == "counter" else ""
+                    lines.append(f"# TYPE {PREFIX}{name}{suffix} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{PREFIX}{name}{suffix}{label_text(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (series_name, labels), histogram in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, value in zip(BUCKETS + ("+Inf",), histogram.counts):
+                        cumulative += value
+                        lines.append(f"{PREFIX}{name}_bucket{label_text(labels, le=bound)} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_sum{label_text(labels)} {histogram.sum}")
+                    lines.append(f"{PREFIX}{name}_count{label_text(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def print_summary(self):
+        # Percentiles des étapes et des phases HTTP par hôte, en millisecondes
+        print(f"\n{'mesure':<48} {'n':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+        for entry in self.summary()["histograms"]:
+            labels = " ".join(str(value) for key, value in entry.items()
+                              if key not in ("name", "count", "sum", "mean", "p50", "p95", "p99"))
+            name = entry["name"].removesuffix("_seconds")
+            print(f"{(name + ' ' + labels)[:48]:<48} {entry['count']:>7} "
+                  + " ".join(f"{entry.get(q, 0) * 1000:>9.1f}" for q in ("p50", "p95", "p99")))
+        gauges = {entry["name"]: entry["value"] for entry in self.summary()["gauges"] if "worker" not in entry}
+        print(f"⏱️ {gauges['wall_seconds']:.1f}s de temps mur, {gauges['cpu_seconds']:.1f}s de CPU")
+
+registry = Registry()
+count = registry.count
+gauge = registry.gauge
+observe = registry.observe
+timer = registry.timer
+
+def timed(name, **labels):
+    # Décorateur : durée de chaque appel dans l'histogramme `name`
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with registry.timer(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def reset():
+    global registry, count, gauge, observe, timer
+    registry = Registry()
+    count, gauge, observe, timer = registry.count, registry.gauge, registry.observe, registry.timer
+
+def write_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(registry.summary(), f, indent=2, ensure_ascii=False)
+    log.info("📈 Métriques écrites dans %s", path)
+
+def write_prometheus(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(registry.prometheus_text())
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    log.info("📈 Métriques Prometheus sur http://%s:%s/metrics", host, server.server_address[1])
+    return server
+
+def add_arguments(parser):
+    group = parser.add_argument_group("métriques")
+    group.add_argument("--metrics-json", default=DEFAULT_METRICS_PATH,
+                       help="résumé JSON écrit en fin de run : compteurs, percentiles par hôte des phases HTTP "
+                            "(dns, connect, tls, ttfb, body) et par étape, CPU et temps réel")
+    group.add_argument("--prometheus-file", default=None, help="métriques au format texte Prometheus en fin de run")
+    group.add_argument("--prometheus-port", type=int, default=None, help="sert /metrics pendant le run")
+
+def configure_from_args(args):
+    if args.prometheus_port is not None:
+        serve(args.prometheus_port)
+
+def finish_from_args(args):
+    registry.print_summary()
+    if args.metrics_json:
+        write_json(args.metrics_json)
+    if args.prometheus_file:
+        write_prometheus(args.prometheus_file)
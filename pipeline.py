@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+
+import logs
+
+log = logs.get_logger("pipeline")
+
+_DONE = object()
+
+class Stage:
+    def __init__(self, name, func, workers=1, queue_size=100):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0.0
+
+    def record(self, elapsed, result=None, failed=False):
+        with self.lock:
+            self.busy += elapsed
+            if failed:
+                self.failed += 1
+            elif result is None:
+                self.dropped += 1
+            else:
+                self.processed += 1
+
+class Pipeline:
+    # Chaque étape a son pool de threads et sa file bornée : une étape lente
+    # ne ralentit les précédentes qu'une fois sa file pleine
+    def __init__(self, stages, on_done=None, on_error=None):
+        self.stages = stages
+        self.on_done = on_done
+        self.on_error = on_error
+        self.elapsed = 0.0
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        next_queue = self.stages[index + 1].queue if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _DONE:
+                break
+            started = time.perf_counter()
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                stage.record(time.perf_counter() - started, failed=True)
+                log.exception("❌ Exception étape %s : %s", stage.name, e)
+                if self.on_error:
+                    self.on_error(item, e)
+                result = None
+            else:
+                stage.record(time.perf_counter() - started, result)
+            if result is not None and next_queue is not None:
+                next_queue.put(result)
+            if self.on_done and (result is None or next_queue is None):
+                self.on_done(item)
+
+    def run(self, items):
+        started = time.perf_counter()
+        threads = []
+        for index, stage in enumerate(self.stages):
+            stage_threads = [
+                threading.Thread(target=self._worker, args=(index,), name=f"{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+
+        for item in items:
+            self.stages[0].queue.put(item)
+
+        # Une étape n'est close qu'après la fin de tous ses workers, puis on ferme la suivante
+        for stage, stage_threads in zip(self.stages, threads):
+            for _ in stage_threads:
+                stage.queue.put(_DONE)
+            for thread in stage_threads:
+                thread.join()
+
+        self.elapsed = time.perf_counter() - started
+        return self.stats()
+
+    def stats(self):
+        return [
+            {
+                "stage": stage.name,
+                "workers": stage.workers,
+                "processed": stage.processed,
+                "dropped": stage.dropped,
+                "failed": stage.failed,
+                "busy_seconds": round(stage.busy, 3),
+                "items_per_second": round(stage.processed / self.elapsed, 2) if self.elapsed else 0.0,
+            }
+            for stage in self.stages
+        ]
+
+def print_stats(stats, elapsed):
+    print(f"\n⏱️ Pipeline terminé en {elapsed:.1f}s")
+    print(f"{'étape':<8} {'workers':>7} {'ok':>7} {'ignorés':>8} {'erreurs':>8} {'occupé (s)':>11} {'débit (/s)':>11}")
+    for s in stats:
+        print(f"{s['stage']:<8} {s['workers']:>7} {s['processed']:>7} {s['dropped']:>8} "
+              f"{s['failed']:>8} {s['busy_seconds']:>11.1f} {s['items_per_second']:>11.2f}")
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet optionnel : nécessite pyarrow
+    pa = pq = None
+
+DEFAULT_SHARD_SIZE = 10000
+DEFAULT_BATCH_SIZE = 500
+
+class ShardedStore:
+    # Regroupe les fiches par lots ; un shard est écrit sous .tmp puis renommé une fois complet,
+    # un lecteur ne voit donc jamais de shard à moitié écrit
+    extension = None
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.batch = []
+        self.callbacks = []
+        self.shard_records = 0
+        self.written = 0
+        self.recover()
+        self.shard_index = self.next_shard_index()
+
+    def shard_path(self, index):
+        return self.directory / f"part-{index:05d}{self.extension}"
+
+    def next_shard_index(self):
+        indexes = [int(path.name[5:10]) for path in self.directory.glob(f"part-*{self.extension}")]
+        return max(indexes, default=0) + 1
+
+    def recover(self):
+        pass
+
+    def write(self, record, on_written=None):
+        # on_written est appelé une fois la fiche réellement écrite sur disque
+        with self.lock:
+            self.batch.append(record)
+            if on_written:
+                self.callbacks.append(on_written)
+            if len(self.batch) >= self.batch_size or self.shard_records + len(self.batch) >= self.shard_size:
+                self.flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self.flush_locked()
+
+    def flush_locked(self):
+        if self.batch:
+            self.write_batch(self.batch)
+            self.shard_records += len(self.batch)
+            self.written += len(self.batch)
+            self.batch = []
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+        if self.shard_records >= self.shard_size:
+            self.rotate()
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            if self.shard_records:
+                self.rotate()
+
+class JsonlStore(ShardedStore):
+    extension = ".jsonl"
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        self.file = None
+        super().__init__(directory, shard_size, batch_size)
+
+    def recover(self):
+        # Un .tmp laissé par un run interrompu contient des lots complets : on le finalise
+        for tmp in sorted(self.directory.glob("part-*.jsonl.tmp")):
+            with open(tmp, "rb+") as f:
+                content = f.read()
+                f.truncate(content.rfind(b"\n") + 1)
+            os.replace(tmp, tmp.with_suffix(""))
+
+    def write_batch(self, records):
+        if self.file is None:
+            self.file = open(str(self.shard_path(self.shard_index)) + ".tmp", "a", encoding="utf-8")
+        self.file.write("".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                                for record in records))
+        # Un fsync par lot, avant les callbacks qui marquent les codes terminés dans le journal
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def rotate(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.file = None
+        path = self.shard_path(self.shard_index)
+        os.replace(str(path) + ".tmp", path)
+        self.shard_index += 1
+        self.shard_records = 0
+
+class ParquetStore(ShardedStore):
+    # Parquet ne s'écrit pas par ajout : les lots restent en mémoire jusqu'à la rotation
+    extension = ".parquet"
+
+    def __init__(self, directory, shard_size=DEFAULT_SHARD_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+        if pa is None:
+            raise RuntimeError("pyarrow n'est pas installé, utiliser --store jsonl")
+        self.pending = []
+        super().__init__(directory, shard_size, batch_size)
+
+    def write_batch(self, records):
+        self.pending.extend(records)
+
+    def flush_locked(self):
+        # Les callbacks attendent l'écriture du shard, pas seulement du lot
+        if self.batch:
+            self.write_batch(self.batch)
+            self.shard_records += len(self.batch)
+            self.written += len(self.batch)
+            self.batch = []
+        if self.shard_records >= self.shard_size:
+            self.rotate()
+
+    def close(self):
+        with self.lock:
+            self.flush_locked()
+            if self.shard_records:
+                self.rotate()
+
+    def rotate(self):
+        path = self.shard_path(self.shard_index)
+        tmp = str(path) + ".tmp"
+        pq.write_table(pa.Table.from_pylist(self.pending), tmp)
+        os.replace(tmp, path)
+        self.pending = []
+        self.shard_index += 1
+        self.shard_records = 0
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+STORES = {
+    "jsonl": JsonlStore,
+    "parquet": ParquetStore,
+}
+
+def open_store(kind, directory, shard_size=DEFAULT_SHARD_SIZE, batch_size=DEFAULT_BATCH_SIZE):
+    return STORES[kind](directory, shard_size, batch_size)
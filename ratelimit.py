@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Réponses passagères retentées par le transport : limitation et erreurs serveur 5xx
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt, retry_after=None, base=1.0, cap=60.0):
+    # Retry-After du serveur en priorité, sinon exponentielle avec jitter complet
+    delay = parse_retry_after(retry_after)
+    if delay is not None:
+        return min(delay, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class HostBucket:
+    # Token bucket dont le débit suit une logique AIMD : +increase req/s par seconde tant que les réponses
+    # sont saines, x decrease sur 429/5xx, erreur réseau ou latence qui dérive
+    def __init__(self, rate, min_rate, max_rate, increase, decrease, latency_factor, latency_floor, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.latency_floor = latency_floor
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.latency = None
+        self.baseline = None
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.slowdowns = 0
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            self.requests += 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+    def slow_down(self):
+        # Une seule baisse par fenêtre : plusieurs 429 en vol ne doivent pas effondrer le débit
+        now = time.monotonic()
+        if now < self.cooldown_until:
+            return
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0.0)
+        self.cooldown_until = now + 1.0 / self.rate
+        self.slowdowns += 1
+
+    def on_success(self, latency):
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.baseline = self.latency if self.baseline is None else min(self.baseline, self.latency)
+            # Le plancher évite de freiner sur la gigue d'hôtes très rapides
+            threshold = max(self.baseline * self.latency_factor, self.baseline + self.latency_floor)
+            if self.latency > threshold:
+                self.slow_down()
+            elif time.monotonic() >= self.cooldown_until:
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self.lock:
+            self.throttled += 1
+            self.slow_down()
+
+class AdaptiveLimiter:
+    def __init__(self, initial_rate=2.0, min_rate=0.2, max_rate=50.0, increase=2.0, decrease=0.5,
+                 latency_factor=3.0, latency_floor=0.25, burst=1.0):
+        self.settings = dict(min_rate=min_rate, max_rate=max_rate, increase=increase, decrease=decrease,
+                             latency_factor=latency_factor, latency_floor=latency_floor, burst=burst)
+        self.initial_rate = initial_rate
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def bucket(self, host):
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = HostBucket(self.initial_rate, **self.settings)
+            return bucket
+
+    def acquire(self, host):
+        self.bucket(host).acquire()
+
+    def on_success(self, host, latency):
+        self.bucket(host).on_success(latency)
+
+    def on_throttle(self, host):
+        self.bucket(host).on_throttle()
+
+    def stats(self):
+        return {
+            host: {"rate": round(bucket.rate, 2), "requests": bucket.requests, "throttled": bucket.throttled,
+                   "slowdowns": bucket.slowdowns}
+            for host, bucket in self.buckets.items()
+        }
+
+    def print_stats(self):
+        for host, stats in self.stats().items():
+            print(f"🚦 {host} : {stats['rate']} req/s en fin de run, {stats['requests']} requêtes, "
+                  f"{stats['throttled']} throttlées, {stats['slowdowns']} ralentissements")
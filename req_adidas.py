@@ -1,12 +1,29 @@
 import os
 import json
-import requests
+import argparse
+import threading
+import sys
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 from PIL import Image
 from io import BytesIO
 from tqdm import tqdm
-import traceback
+import tempfile
+from datetime import datetime, timezone
+from pipeline import Pipeline, Stage, print_stats
+from checkpoint import DEFAULT_CHECKPOINT_PATH, Checkpoint
+import product_store
+from image_store import ImageStore, sniff_image_type
+import image_profiles
+import logs
+import metrics
+import supervisor
+import transport
+import writers
+from adidas import URL_MAP, country_sites
+from listing import link_prefix
+
+log = logs.get_logger("products")
 
 BASE_INPUT = Path("adidas_data")
 BASE_OUTPUT = Path("adidas_products")
@@ -28,7 +45,14 @@ HEADERS = {
     "DNT": "1",
 }
 
-BASE_API_URL = "https://www.adidas.fr/plp-app/api/product/"
+# Une ligne JSON par appartenance rejetée, relisible avec --replay-rejected
+REJECTED_LOG = "rejected_codes.jsonl"
+# Chaque pays interroge son propre hôte : prix, devise et URL produit en dépendent
+COUNTRY_SITES = country_sites(URL_MAP)
+DEFAULT_SITE = "https://www.adidas.fr"
+API_PATH = "/plp-app/api/product/"
+# Variante groupée : ?ids=CODE1,CODE2,... -> {"products": [...]}, utilisée avec --batch-size > 1
+BATCH_API_PATH = "/plp-app/api/products"
 CATEGORY_TRANSLATIONS = {
     "vetements": "clothing",
     "chaussures": "shoes",
@@ -41,123 +65,547 @@ CURRENCY_BY_COUNTRY = {
 }
 
 country_seen_ids = {}  # <- Pour suivre les ID déjà vus par pays
+seen_ids_lock = threading.Lock()
+checkpoint = None  # <- Journal de reprise, ouvert par open_checkpoint
+store = None  # <- Stockage groupé des fiches (jsonl/parquet), sinon un JSON par code
+image_mode = "transcode"  # <- "passthrough" : octets copiés tels quels, "store" : blobs dédupliqués
+image_store = None
+image_store_lock = threading.Lock()
+image_profile = image_profiles.DEFAULT_PROFILE  # <- thumb/medium : rendu plus léger demandé au CDN
+image_sample_every = image_profiles.DEFAULT_SAMPLE_EVERY
+profile_meter = None
+batcher = None  # <- Lookups groupés, ouvert par open_batcher quand --batch-size > 1
+harvest = None  # <- {(pays, code): fiche} récoltées sur les listings, ouvert par open_harvest
+harvest_stats = {"listing": 0, "api": 0}
+harvest_lock = threading.Lock()
+# Champs de la fiche API requis par build_output : s'il en manque un, l'API complète la fiche.
+# hoverImage est facultatif (une carte à une seule image reste complète)
+HARVEST_FIELDS = ("id", "title", "url", "priceData", "image")
 
 def sanitize_filename(name):
     return name.replace("/", "_").replace("\\", "_").replace("?", "_").replace("&", "_")
 
-def download_image(url, local_path):
+def claim_product_id(country, product_id):
+    # Vérifie et réserve l'ID en une seule opération pour rester correct entre threads
+    with seen_ids_lock:
+        seen_ids = country_seen_ids.setdefault(country, set())
+        if product_id in seen_ids:
+            return False
+        seen_ids.add(product_id)
+        return True
+
+def log_rejected(code, memberships, reason, status):
+    rejected = writers.get_writer(REJECTED_LOG, writers.JsonlWriter)
+    timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    for country, gender, category in memberships:
+        rejected.write_record({"code": code, "country": country, "gender": gender, "category": category,
+                          "status": status, "reason": reason, "timestamp": timestamp})
+    if checkpoint:
+        checkpoint.rejected(code, reason)
+
+def mark_done(code, outputs):
+    if checkpoint:
+        checkpoint.done(code, [(country, output["id"]) for country, _, output in outputs])
+
+def mark_failed(code, error):
+    if checkpoint:
+        checkpoint.failed(code, repr(error))
+
+def open_checkpoint(path, resume=False, scope=""):
+    # Sans --resume le journal repart de zéro ; avec, on recharge les ID déjà écrits par pays
+    global checkpoint
+    checkpoint = Checkpoint(path, reset=not resume, scope=scope)
+    if resume:
+        with seen_ids_lock:
+            for country, ids in checkpoint.seen_ids().items():
+                country_seen_ids.setdefault(country, set()).update(ids)
+    return checkpoint
+
+def close_checkpoint():
+    global checkpoint
+    if checkpoint:
+        summary = checkpoint.summary()
+        log.info("📒 Journal : %s", ", ".join(f"{state} {count}" for state, count in sorted(summary.items())))
+        checkpoint.close()
+        checkpoint = None
+
+def pending_plan(plan):
+    if not checkpoint:
+        return plan
+    pending = {code: memberships for code, memberships in plan.items() if not checkpoint.is_finished(code)}
+    if len(pending) != len(plan):
+        log.info("⏭️ Reprise : %s codes déjà terminés ignorés", len(plan) - len(pending))
+    return pending
+
+@metrics.timed("stage_seconds", stage="image_download")
+def fetch_image(url):
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
+        response = transport.get_transport().get(url, cache="image", headers=HEADERS, timeout=10)
         if response.status_code == 200:
-            img = Image.open(BytesIO(response.content))
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            img.save(local_path)
-            print(f"🖼️ Image téléchargée : {local_path}")
-        else:
-            print(f"❌ Erreur image {url}: {response.status_code}")
+            return response.content
+        log.error("❌ Erreur image %s: %s", url, response.status_code)
     except Exception as e:
-        print(f"❌ Exception image {url}: {e}")
-        traceback.print_exc()
+        log.exception("❌ Exception image %s: %s", url, e)
+    return None
 
-def process_product(code, country, gender, category):
-    if not code:
-        print("⚠️ Code vide ignoré")
-        return
+@metrics.timed("stage_seconds", stage="image_save")
+def save_image(content, local_path):
+    # Fichier temporaire renommé : le chemin produit peut être un lien physique vers un blob
+    # d'image_store.py, qu'une écriture en place modifierait pour tous les produits liés
+    tmp_path = None
+    try:
+        img = Image.open(BytesIO(content))
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(local_path), suffix=Path(local_path).suffix)
+        os.close(fd)
+        img.save(tmp_path)
+        os.replace(tmp_path, local_path)
+        log.debug("🖼️ Image téléchargée : %s", local_path)
+    except Exception as e:
+        log.exception("❌ Exception image %s: %s", local_path, e)
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-    url = BASE_API_URL + code
-    print(f"🔎 Traitement du produit : {code} ({country}/{gender}/{category})")
+def download_image(url, local_path):
+    content = fetch_image(url)
+    if content is not None:
+        save_image(content, local_path)
 
+@metrics.timed("stage_seconds", stage="image_download")
+def download_image_raw(url, local_path):
+    # Écrit le corps par morceaux dans un fichier temporaire renommé à la fin ; seule la
+    # signature est vérifiée et l'extension suit le format réel. Renvoie le chemin final
+    local_path = Path(local_path)
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=local_path.parent, suffix=".part")
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        if response.status_code != 200:
-            print(f"❌ Requête échouée pour {code} : {response.status_code}")
-            with open("rejected_codes.txt", "a", encoding="utf-8") as log:
-                log.write(f"{code} ({country}/{gender}/{category}) - HTTP {response.status_code}\n")
-            return
+        status = {}
+        extension = None
+        chunks = transport.get_transport().stream(url, 65536, cache="image", status=status,
+                                                  headers=HEADERS, timeout=10)
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                if status["code"] != 200:
+                    break
+                if extension is None:
+                    extension = sniff_image_type(chunk[:16])
+                    if extension is None:
+                        break
+                f.write(chunk)
+        if status.get("code") != 200:
+            log.error("❌ Erreur image %s: %s", url, status.get('code'))
+            return None
+        if extension is None:
+            log.error("❌ Contenu non reconnu comme image : %s", url)
+            return None
+        final_path = local_path.with_suffix(extension)
+        os.replace(tmp_path, final_path)
+        log.debug("🖼️ Image téléchargée : %s", final_path)
+        return str(final_path).replace("\\", "/")
+    except Exception as e:
+        log.exception("❌ Exception image %s: %s", url, e)
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-        data = response.json()
-        product = data.get("product", {})
-        product_id = product.get("id")
+def get_image_store():
+    global image_store
+    with image_store_lock:
+        if image_store is None:
+            image_store = ImageStore(IMAGES_DIR)
+        return image_store
 
-        if not product_id:
-            print(f"⚠️ Pas d'ID produit retourné pour {code}")
-            with open("rejected_codes.txt", "a", encoding="utf-8") as log:
-                log.write(f"{code} ({country}/{gender}/{category}) - Pas d'ID produit\n")
-            return
+def close_image_store():
+    global image_store
+    if image_store is not None:
+        image_store.print_report()
+        image_store.close()
+        image_store = None
 
-        # Vérification de doublon dans le pays
-        seen_ids = country_seen_ids.setdefault(country, set())
-        if product_id in seen_ids:
-            print(f"⚠️ Doublon ignoré dans {country} : {product_id}")
-            return
-        seen_ids.add(product_id)
+def get_profile_meter():
+    global profile_meter
+    with image_store_lock:
+        if profile_meter is None:
+            profile_meter = image_profiles.ProfileMeter(image_profile, image_sample_every)
+        return profile_meter
 
-        name = product.get("title")
-        url_suffix = product.get("url")
-        full_url = f"https://www.adidas.{country}/{url_suffix.lstrip('/')}" if url_suffix else ""
-        image_main = product.get("image")
-        image_hover = product.get("hoverImage")
-        price_data = product.get("priceData", {})
-        current_price = price_data.get("salePrice", price_data.get("price"))
-        original_price = price_data.get("price")
-        is_discount = current_price != original_price
-        translated_category = CATEGORY_TRANSLATIONS.get(category, category)
-        currency = CURRENCY_BY_COUNTRY.get(country, "EUR")
-
-        output = {
-            "id": product_id,
-            "name": name,
-            "brand": "adidas",
-            "color": "",
-            "category": translated_category,
-            "section": gender,
-            "country": country,
-            "price": {
-                "value_original": original_price,
-                "current_price": current_price,
-                "is_Discount": is_discount,
-                "currency": currency
-            },
-            "url": full_url,
-            "product_code": product_id,
-            "images": []
-        }
-
-        img_dir = IMAGES_DIR / product_id
-        img_dir.mkdir(parents=True, exist_ok=True)
-
-        if image_main:
-            local_main = img_dir / "main.jpg"
-            download_image(image_main, str(local_main))
-            output["images"].append({
-                "type": "main",
-                "url": image_main,
-                "local_path": str(local_main).replace("\\", "/")
-            })
+def close_profile_meter():
+    global profile_meter
+    if profile_meter is not None:
+        profile_meter.report()
+        profile_meter = None
+
+def fetch_rendition(image):
+    # image["url"] reste l'URL de l'API dans la fiche ; le CDN sert le rendu du profil
+    content = fetch_image(image_profiles.rendition_url(image["url"], image_profile))
+    if content is not None:
+        get_profile_meter().record(image["url"], len(content), HEADERS)
+    return content
+
+def unique_images(outputs):
+    # Chaque pays a sa propre fiche et ses propres images : regroupées par chemin local (ID produit
+    # et type d'image), jamais par position dans la liste d'un pays. La première URL est téléchargée
+    images = {}
+    for _, _, output in outputs:
+        for image in output["images"]:
+            images.setdefault(image["local_path"], []).append(image)
+    return list(images.values())
+
+def download_images(outputs):
+    # Une image commune à plusieurs sorties n'est téléchargée qu'une fois, chemin final reporté dans chacune
+    for entries in unique_images(outputs):
+        image = entries[0]
+        if image_mode in ("passthrough", "store"):
+            url = image_profiles.rendition_url(image["url"], image_profile)
+            if image_mode == "store":
+                with metrics.timer("stage_seconds", stage="image_download"):
+                    local_path = get_image_store().fetch(
+                        url, image["local_path"], HEADERS,
+                        on_download=lambda size: get_profile_meter().record(image["url"], size, HEADERS))
+            else:
+                local_path = download_image_raw(url, image["local_path"])
+                if local_path:
+                    get_profile_meter().record(image["url"], os.path.getsize(local_path), HEADERS)
+            if local_path:
+                for entry in entries:
+                    entry["local_path"] = local_path
+        else:
+            content = fetch_rendition(image)
+            if content is not None:
+                save_image(content, image["local_path"])
+
+def describe_memberships(memberships):
+    return ", ".join(f"{country}/{gender}/{category}" for country, gender, category in memberships)
+
+def country_site(country):
+    return COUNTRY_SITES.get(country, DEFAULT_SITE)
+
+def country_headers(country):
+    return dict(HEADERS, Referer=country_site(country) + "/")
+
+def group_by_country(memberships):
+    groups = {}
+    for membership in memberships:
+        groups.setdefault(membership[0], []).append(membership)
+    return groups
+
+def fetch_batch(country, codes):
+    # Renvoie {code: produit} pour les codes présents dans la réponse, None si l'appel échoue ;
+    # les codes absents repassent par l'API unitaire
+    url = country_site(country) + BATCH_API_PATH + "?ids=" + ",".join(codes)
+    log.debug("📦 Lot de %s codes pour %s", len(codes), country)
+    response = transport.get_transport().get(url, cache="product", headers=country_headers(country), timeout=10)
+    if response.status_code != 200:
+        log.error("❌ Lot échoué pour %s : %s", country, response.status_code)
+        return None
+    products = response.json().get("products") or []
+    return {product["id"]: product for product in products if product.get("id")}
+
+class ProductBatcher:
+    # Le premier code demandé pour un pays part avec les batch_size - 1 codes suivants du plan
+    # pour ce pays ; les workers qui demandent ces codes attendent la même réponse. Au premier lot
+    # échoué ou illisible sur un hôte, les lots y sont abandonnés au profit de l'API unitaire
+    def __init__(self, plan, batch_size):
+        self.batch_size = batch_size
+        self.queues = {}
+        for code, memberships in plan.items():
+            for country in group_by_country(memberships):
+                self.queues.setdefault(country, []).append(code)
+        self.positions = dict.fromkeys(self.queues, 0)
+        self.requested = set()
+        self.events = {}
+        self.results = {}
+        self.disabled = set()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.hits = 0
+        self.misses = 0
+
+    def next_batch(self, country, code):
+        batch = [code]
+        self.requested.add((country, code))
+        queue = self.queues.get(country, [])
+        position = self.positions.get(country, 0)
+        while len(batch) < self.batch_size and position < len(queue):
+            candidate = queue[position]
+            position += 1
+            if (country, candidate) not in self.requested:
+                self.requested.add((country, candidate))
+                batch.append(candidate)
+        self.positions[country] = position
+        return batch
+
+    def get(self, country, code):
+        key = (country, code)
+        host = urlsplit(country_site(country)).netloc
+        with self.lock:
+            event = self.events.get(key)
+            if event is None and host in self.disabled:
+                self.misses += 1
+                return None
+            owner = event is None
+            if owner:
+                batch = self.next_batch(country, code)
+                event = threading.Event()
+                for batch_code in batch:
+                    self.events[(country, batch_code)] = event
+        if owner:
+            products = None
+            try:
+                products = fetch_batch(country, batch)
+            except Exception as e:
+                log.error("❌ Exception sur le lot %s : %s", country, e)
+            with self.lock:
+                self.batches += 1
+                if products is None and host not in self.disabled:
+                    self.disabled.add(host)
+                    log.warning("⚠️ API groupée en échec sur %s : lots désactivés, API unitaire pour la suite", host)
+                for batch_code in batch:
+                    self.results[(country, batch_code)] = (products or {}).get(batch_code)
+            event.set()
+        event.wait()
+        with self.lock:
+            self.events.pop(key, None)
+            product = self.results.pop(key, None)
+            if product is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return product
+
+def open_batcher(plan, batch_size):
+    global batcher
+    if batch_size > 1:
+        batcher = ProductBatcher(plan, batch_size)
+    return batcher
+
+def close_batcher():
+    global batcher
+    if batcher is not None:
+        log.info("📦 %s lots, %s fiches groupées, %s redemandées à l'API unitaire",
+                 batcher.batches, batcher.hits, batcher.misses)
+        batcher = None
+
+def missing_fields(product):
+    missing = [field for field in HARVEST_FIELDS if not product.get(field)]
+    # Un prix soldé sans prix d'origine donnerait value_original=None
+    if "priceData" not in missing and product["priceData"].get("price") is None:
+        missing.append("priceData")
+    return missing
+
+def open_harvest(countries=None):
+    # Lit les *_products.jsonl écrits par adidas.py --harvest à côté des *_codes.txt
+    global harvest
+    harvest = {}
+    for country, gender, category, file in iter_code_files(countries):
+        path = file.with_name(file.name.replace("_codes.txt", "_products.jsonl"))
+        if not path.exists():
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    product = json.loads(line)
+                    harvest[(country, product["id"])] = product
+    harvest_stats.update(listing=0, api=0)
+    log.info("🌾 %s fiches récoltées sur les listings", len(harvest))
+    return harvest
+
+def close_harvest():
+    global harvest
+    if harvest is not None:
+        log.info("🌾 %s fiches prises sur les listings, %s demandées à l'API",
+                 harvest_stats["listing"], harvest_stats["api"])
+        harvest = None
+
+def harvested_product(code, country):
+    product = harvest.get((country, code)) if harvest else None
+    return product if product and not missing_fields(product) else None
 
-        if image_hover:
-            local_hover = img_dir / "hover.jpg"
-            download_image(image_hover, str(local_hover))
+def api_plan(plan):
+    # Appartenances qui passeront encore par l'API : les lots ne demandent pas les fiches récoltées
+    if not harvest:
+        return plan
+    pending = {}
+    for code, memberships in plan.items():
+        memberships = [m for m in memberships if harvested_product(code, m[0]) is None]
+        if memberships:
+            pending[code] = memberships
+    return pending
+
+def lookup_product(code, country, memberships):
+    # Fiche du listing si elle est complète ; sinon l'API, dont les champs priment
+    product = harvested_product(code, country)
+    with harvest_lock:
+        harvest_stats["listing" if product else "api"] += 1
+    if product is not None:
+        log.debug("🌾 Fiche récoltée pour %s (%s)", code, country)
+        return product
+    product = fetch_product(code, country, memberships)
+    partial = harvest.get((country, code)) if harvest else None
+    if product is not None and partial:
+        product = dict(partial, **{key: value for key, value in product.items() if value})
+    return product
+
+@metrics.timed("stage_seconds", stage="product_api")
+def fetch_product(code, country, memberships):
+    log.debug("🔎 Traitement du produit : %s (%s)", code, describe_memberships(memberships))
+    if batcher is not None:
+        product = batcher.get(country, code)
+        if product is not None:
+            return product
+
+    url = country_site(country) + API_PATH + code
+    response = transport.get_transport().get(url, cache="product", headers=country_headers(country), timeout=10)
+    if response.status_code != 200:
+        log.error("❌ Requête échouée pour %s : %s", code, response.status_code)
+        log_rejected(code, memberships, f"HTTP {response.status_code}", response.status_code)
+        return None
+
+    data = response.json()
+    product = data.get("product", {})
+
+    if not product.get("id"):
+        log.warning("⚠️ Pas d'ID produit retourné pour %s", code)
+        log_rejected(code, memberships, "Pas d'ID produit", "no_product_id")
+        return None
+
+    return product
+
+def build_outputs(product, memberships, all_memberships=None):
+    # Une sortie par appartenance, sauf si l'ID a déjà été écrit pour ce pays
+    product_id = product.get("id")
+    outputs = []
+    for country, gender, category in memberships:
+        if not claim_product_id(country, product_id):
+            log.debug("⚠️ Doublon ignoré dans %s : %s", country, product_id)
+            continue
+        output = build_output(product, country, gender, category)
+        output["memberships"] = [
+            {"country": c, "section": g, "category": CATEGORY_TRANSLATIONS.get(cat, cat)}
+            for c, g, cat in all_memberships or memberships
+        ]
+        outputs.append((country, gender, output))
+    return outputs
+
+def fetch_outputs(code, memberships):
+    # Un appel par pays du code ; None si aucun pays n'a renvoyé de fiche
+    outputs = None
+    for country, country_memberships in group_by_country(memberships).items():
+        product = lookup_product(code, country, country_memberships)
+        if product is None:
+            continue
+        outputs = (outputs or []) + build_outputs(product, country_memberships, memberships)
+    return outputs
+
+def build_output(product, country, gender, category):
+    product_id = product.get("id")
+    name = product.get("title")
+    url_suffix = product.get("url")
+    full_url = f"{link_prefix(country_site(country))}/{url_suffix.lstrip('/')}" if url_suffix else ""
+    price_data = product.get("priceData", {})
+    current_price = price_data.get("salePrice", price_data.get("price"))
+    original_price = price_data.get("price")
+    is_discount = current_price != original_price
+    translated_category = CATEGORY_TRANSLATIONS.get(category, category)
+    currency = CURRENCY_BY_COUNTRY.get(country, "EUR")
+
+    output = {
+        "id": product_id,
+        "name": name,
+        "brand": "adidas",
+        "color": "",
+        "category": translated_category,
+        "section": gender,
+        "country": country,
+        "price": {
+            "value_original": original_price,
+            "current_price": current_price,
+            "is_Discount": is_discount,
+            "currency": currency
+        },
+        "url": full_url,
+        "product_code": product_id,
+        "images": []
+    }
+
+    img_dir = IMAGES_DIR / product_id
+    for image_type, key in (("main", "image"), ("hover", "hoverImage")):
+        image_url = product.get(key)
+        if image_url:
+            local_path = img_dir / f"{image_type}{image_profiles.extension(image_profile)}"
             output["images"].append({
-                "type": "hover",
-                "url": image_hover,
-                "local_path": str(local_hover).replace("\\", "/")
+                "type": image_type,
+                "url": image_url,
+                "local_path": str(local_path).replace("\\", "/")
             })
+    return output
+
+def write_json(output, code, country, gender):
+    json_output_path = BASE_OUTPUT / country / gender / f"{code}.json"
+    json_output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(json_output_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=4, ensure_ascii=False)
+    log.debug("✅ Données sauvegardées : %s", json_output_path)
+
+@metrics.timed("stage_seconds", stage="json_write")
+def write_records(code, outputs, on_written=None):
+    if store is None:
+        for country, gender, output in outputs:
+            write_json(output, code, country, gender)
+        if on_written:
+            on_written()
+        return
+    for index, (country, gender, output) in enumerate(outputs):
+        # Les fiches d'un code partent dans le même lot : le rappel suit la dernière
+        last = index == len(outputs) - 1
+        store.write(dict(output, code=code), on_written if last else None)
+
+def open_store(kind, shard_size=product_store.DEFAULT_SHARD_SIZE, batch_size=product_store.DEFAULT_BATCH_SIZE,
+               subdir=None):
+    # subdir : un répertoire de shards par process worker, deux process n'écrivent jamais le même shard
+    global store
+    if kind != "files":
+        directory = BASE_OUTPUT / "records"
+        if subdir:
+            directory = directory / subdir
+        store = product_store.open_store(kind, directory, shard_size, batch_size)
+    return store
+
+def close_store():
+    global store
+    if store is not None:
+        store.close()
+        log.info("🗃️ %s fiches écrites dans %s", store.written, store.directory)
+        store = None
+
+def process_product(code, memberships):
+    if not code:
+        log.warning("⚠️ Code vide ignoré")
+        return
+
+    try:
+        outputs = fetch_outputs(code, memberships)
+        if outputs is None:
+            return
+        if not outputs:
+            mark_done(code, outputs)
+            return
 
-        json_output_path = BASE_OUTPUT / country / gender / f"{code}.json"
-        json_output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Les images sont rangées par ID produit : un seul téléchargement pour toutes les appartenances
+        download_images(outputs)
 
-        with open(json_output_path, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=4, ensure_ascii=False)
-        print(f"✅ Données sauvegardées : {json_output_path}")
+        write_records(code, outputs, lambda: mark_done(code, outputs))
 
     except Exception as e:
-        print(f"❌ Exception pour {code} : {e}")
-        traceback.print_exc()
+        log.exception("❌ Exception pour %s : %s", code, e)
+        mark_failed(code, e)
 
-def run_all(test_mode=False):
+def iter_code_files(countries=None):
     for country_dir in BASE_INPUT.iterdir():
-        if not country_dir.is_dir():
+        if not country_dir.is_dir() or (countries and country_dir.name not in countries):
             continue
         country = country_dir.name
 
@@ -168,25 +616,253 @@ def run_all(test_mode=False):
 
             for file in gender_dir.glob("*_codes.txt"):
                 category = file.stem.replace("_codes", "")
-                print(f"📁 Lecture fichier : {file}")
-                with open(file, "r", encoding="utf-8") as f:
-                    codes = [line.strip() for line in f if line.strip()]
-
-                total = len(codes)
-                ok = 0
-                if test_mode:
-                    codes = codes[:100]
-
-                print(f"📊 Traitement des produits {category} ({len(codes)} codes)")
-                for code in tqdm(codes, desc=f"{country} / {gender} / {category}", ncols=100):
-                    try:
-                        process_product(code, country, gender, category)
-                        ok += 1
-                    except Exception as e:
-                        print(f"❌ Erreur sur {code} : {e}")
-                        traceback.print_exc()
-
-                print(f"✅ Fini {country}/{gender}/{category} : {ok}/{total} produits traités")
+                yield country, gender, category, file
+
+def read_codes(file):
+    with open(file, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def build_plan(test_mode=False, countries=None):
+    # Lit chaque *_codes.txt une fois : code unique -> liste de (pays, genre, catégorie)
+    plan = {}
+    lines = 0
+    for country, gender, category, file in iter_code_files(countries):
+        log.debug("📁 Lecture fichier : %s", file)
+        codes = read_codes(file)
+        if test_mode:
+            codes = codes[:100]
+        lines += len(codes)
+        for code in codes:
+            memberships = plan.setdefault(code, [])
+            membership = (country, gender, category)
+            if membership not in memberships:
+                memberships.append(membership)
+    log.info("🗂️ Plan : %s codes uniques pour %s lignes lues", len(plan), lines)
+    return plan
+
+def read_rejected_plan(path, countries=None, statuses=None):
+    # Rejoue un journal des rejets : même forme de plan que build_plan
+    plan = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if countries and record["country"] not in countries:
+                continue
+            if statuses and str(record["status"]) not in statuses:
+                continue
+            memberships = plan.setdefault(record["code"], [])
+            membership = (record["country"], record["gender"], record["category"])
+            if membership not in memberships:
+                memberships.append(membership)
+    log.info("🔁 Rejeu de %s : %s codes", path, len(plan))
+    return plan
+
+def close_writers():
+    for writer in writers.close_all():
+        log.info("📝 %s lignes écrites dans %s en %s lots", writer.written, writer.path, writer.flushes)
+
+def run_all(test_mode=False, checkpoint_path=None, resume=False, store_kind="files", shard_size=None,
+            countries=None, scope="", batch_size=1, replay=None, replay_statuses=None, harvested=False):
+    if checkpoint_path:
+        open_checkpoint(checkpoint_path, resume, scope)
+    open_store(store_kind, shard_size or product_store.DEFAULT_SHARD_SIZE, subdir=scope)
+    plan = read_rejected_plan(replay, countries, replay_statuses) if replay else build_plan(test_mode, countries)
+    plan = pending_plan(plan)
+    if harvested:
+        open_harvest(countries)
+    open_batcher(api_plan(plan), batch_size)
+    supervisor.report_total(len(plan))
+    ok = 0
+    for code, memberships in tqdm(plan.items(), desc="produits", ncols=100):
+        try:
+            process_product(code, memberships)
+            ok += 1
+        except Exception as e:
+            log.exception("❌ Erreur sur %s : %s", code, e)
+        supervisor.report_progress()
+
+    log.info("✅ Fini : %s/%s codes uniques traités", ok, len(plan))
+    close_batcher()
+    close_harvest()
+    close_writers()
+    close_store()
+    close_image_store()
+    close_profile_meter()
+    close_checkpoint()
+
+# Étapes du pipeline : chaque job est un dict enrichi au fil des étapes
+
+def stage_api(job):
+    job["outputs"] = fetch_outputs(job["code"], job["memberships"])
+    if job["outputs"] is None:
+        return None
+    if not job["outputs"]:
+        mark_done(job["code"], job["outputs"])
+        return None
+    return job
+
+def stage_images(job):
+    if image_mode in ("passthrough", "store"):
+        # Déjà écrites sur disque pendant le téléchargement, l'étape save n'a rien à faire
+        download_images(job["outputs"])
+        job["contents"] = []
+    else:
+        job["contents"] = [(entries[0], fetch_rendition(entries[0])) for entries in unique_images(job["outputs"])]
+    return job
+
+def stage_save(job):
+    for image, content in job.pop("contents"):
+        if content is not None:
+            save_image(content, image["local_path"])
+    return job
+
+def stage_json(job):
+    write_records(job["code"], job["outputs"], lambda: mark_done(job["code"], job["outputs"]))
+    return job
+
+def run_pipeline(test_mode=False, api_workers=8, image_workers=8, save_workers=2, json_workers=1,
+                 queue_size=100, checkpoint_path=None, resume=False, store_kind="files", shard_size=None,
+                 countries=None, scope="", batch_size=1, replay=None, replay_statuses=None, harvested=False):
+    if checkpoint_path:
+        open_checkpoint(checkpoint_path, resume, scope)
+    open_store(store_kind, shard_size or product_store.DEFAULT_SHARD_SIZE, subdir=scope)
+    plan = read_rejected_plan(replay, countries, replay_statuses) if replay else build_plan(test_mode, countries)
+    plan = pending_plan(plan)
+    if harvested:
+        open_harvest(countries)
+    open_batcher(api_plan(plan), batch_size)
+    jobs = [{"code": code, "memberships": memberships} for code, memberships in plan.items()]
+    supervisor.report_total(len(jobs))
+    progress = tqdm(total=len(jobs), desc="produits", ncols=100)
+    progress_lock = threading.Lock()
+
+    def on_done(job):
+        with progress_lock:
+            progress.update(1)
+        supervisor.report_progress()
+
+    stages = [
+        Stage("api", stage_api, api_workers, queue_size),
+        Stage("images", stage_images, image_workers, queue_size),
+        Stage("save", stage_save, save_workers, queue_size),
+        Stage("json", stage_json, json_workers, queue_size),
+    ]
+    pipeline = Pipeline(stages, on_done=on_done, on_error=lambda job, error: mark_failed(job["code"], error))
+    stats = pipeline.run(jobs)
+    progress.close()
+    print_stats(stats, pipeline.elapsed)
+    close_batcher()
+    close_harvest()
+    close_writers()
+    close_store()
+    close_image_store()
+    close_profile_meter()
+    close_checkpoint()
+    return stats
+
+def run_country(country, mode="sequential", image_mode_name="transcode", image_profile_name="full",
+                image_sample=image_profiles.DEFAULT_SAMPLE_EVERY, **kwargs):
+    # Point d'entrée d'un process worker : un pays, son propre pool et son propre limiteur
+    global image_mode, image_profile, image_sample_every
+    image_mode = image_mode_name
+    image_profile, image_sample_every = image_profile_name, image_sample
+    kwargs.update(countries=[country], scope=country)
+    if mode == "pipeline":
+        return run_pipeline(**kwargs)
+    return run_all(**kwargs)
+
+def run_supervised(args):
+    # Le découpage se fait par pays : les doublons d'ID sont suivis pays par pays,
+    # un code présent dans plusieurs pays est donc demandé une fois par pays
+    countries = sorted(path.name for path in BASE_INPUT.iterdir() if path.is_dir())
+    options = dict(mode=args.mode, image_mode_name=args.image_mode, image_profile_name=args.image_profile,
+                   image_sample=args.image_profile_sample, test_mode=args.test,
+                   checkpoint_path=args.checkpoint, resume=True, store_kind=args.store, shard_size=args.shard_size,
+                   batch_size=args.batch_size, replay=args.replay_rejected, replay_statuses=args.replay_status,
+                   harvested=args.harvested)
+    if args.mode == "pipeline":
+        options.update(api_workers=args.api_workers, image_workers=args.image_workers,
+                       save_workers=args.save_workers, json_workers=args.json_workers, queue_size=args.queue_size)
+    jobs = [(country, dict(options, country=country)) for country in countries]
+    transport_options = transport.options_from_args(args, max(args.api_workers, args.image_workers))
+    return supervisor.run_workers("req_adidas", "run_country", jobs, transport_options)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Récupère les fiches produits adidas à partir des codes")
+    parser.add_argument("--test", action="store_true", help="limite à 100 codes par fichier")
+    parser.add_argument("--mode", choices=["sequential", "pipeline"], default="sequential")
+    parser.add_argument("--api-workers", type=int, default=8)
+    parser.add_argument("--image-workers", type=int, default=8)
+    parser.add_argument("--save-workers", type=int, default=2)
+    parser.add_argument("--json-workers", type=int, default=1)
+    parser.add_argument("--queue-size", type=int, default=100, help="taille maximum de chaque file entre étapes")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH,
+                        help="journal SQLite de l'état de chaque code")
+    parser.add_argument("--resume", action="store_true",
+                        help="reprend un run interrompu en sautant les codes terminés (done/rejected), dans le même "
+                             "mode (--supervise ou non)")
+    parser.add_argument("--image-mode", choices=["transcode", "passthrough", "store"], default="transcode",
+                        help="transcode : décodage/réencodage PIL, passthrough : octets écrits tels quels, "
+                             "store : blobs par contenu liés aux chemins produits (image_store.py)")
+    parser.add_argument("--image-profile", choices=list(image_profiles.PROFILES),
+                        default=image_profiles.DEFAULT_PROFILE,
+                        help="rendu demandé au CDN : " + ", ".join(
+                            f"{name} ({segment})" if segment else f"{name} (URL de l'API)"
+                            for name, segment in image_profiles.PROFILES.items()))
+    parser.add_argument("--image-profile-sample", type=int, default=image_profiles.DEFAULT_SAMPLE_EVERY,
+                        help="une image sur N comparée au rendu de l'API pour mesurer les octets économisés "
+                             "(0 : jamais)")
+    parser.add_argument("--store", choices=["files"] + sorted(product_store.STORES), default="files",
+                        help="files : un JSON par code (historique), jsonl/parquet : shards dans "
+                             "adidas_products/records (parquet nécessite pyarrow)")
+    parser.add_argument("--shard-size", type=int, default=product_store.DEFAULT_SHARD_SIZE,
+                        help="fiches par shard avant rotation")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="codes demandés par appel à l'API produit groupée (1 : un appel par code) ; codes "
+                             "absents ou lot en échec : API unitaire")
+    parser.add_argument("--replay-rejected", metavar="JSONL", default=None,
+                        help=f"reprend les codes d'un journal des rejets ({REJECTED_LOG}) au lieu des *_codes.txt")
+    parser.add_argument("--replay-status", nargs="+", default=None,
+                        help="ne rejoue que ces statuts (ex. 429 503 no_product_id)")
+    parser.add_argument("--harvested", action="store_true",
+                        help="reprend les fiches récoltées par adidas.py --harvest (*_products.jsonl) et "
+                             "n'appelle l'API que pour les codes dont il manque un champ")
+    parser.add_argument("--supervise", action="store_true",
+                        help="un process worker par pays, chacun avec son pool et son limiteur")
+    transport.add_arguments(parser)
+    logs.add_arguments(parser)
+    metrics.add_arguments(parser)
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    run_all(test_mode=False)
+    args = parse_args()
+    logs.configure_from_args(args)
+    metrics.configure_from_args(args)
+    writers.install_signal_handlers()
+    image_mode = args.image_mode
+    image_profile, image_sample_every = args.image_profile, args.image_profile_sample
+    if args.checkpoint:
+        # Journal remis à zéro ou vérifié avant tout worker : un --resume dans l'autre mode est refusé
+        try:
+            Checkpoint(args.checkpoint, reset=not args.resume, per_country=args.supervise).close()
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+    if args.supervise:
+        run_supervised(args)
+    elif args.mode == "pipeline":
+        transport.configure_from_args(args, max(args.api_workers, args.image_workers))
+        run_pipeline(test_mode=args.test, api_workers=args.api_workers, image_workers=args.image_workers,
+                     save_workers=args.save_workers, json_workers=args.json_workers,
+                     queue_size=args.queue_size, checkpoint_path=args.checkpoint, resume=args.resume,
+                     store_kind=args.store, shard_size=args.shard_size, batch_size=args.batch_size,
+                     replay=args.replay_rejected, replay_statuses=args.replay_status, harvested=args.harvested)
+        transport.get_transport().print_stats()
+    else:
+        transport.configure_from_args(args, max(args.api_workers, args.image_workers))
+        run_all(test_mode=args.test, checkpoint_path=args.checkpoint, resume=args.resume,
+                store_kind=args.store, shard_size=args.shard_size, batch_size=args.batch_size,
+                replay=args.replay_rejected, replay_statuses=args.replay_status, harvested=args.harvested)
+        transport.get_transport().print_stats()
+    metrics.finish_from_args(args)
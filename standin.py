@@ -0,0 +1,368 @@
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from io import BytesIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import listing
+from fixtures import TEXT_TYPES
+
+STEP = 48
+CHUNK_SIZE = 8192
+IMAGE_PREFIX = "/images/"
+# Segment de transformation des URLs d'images de l'API, comme sur le CDN adidas
+API_IMAGE_TRANSFORM = "w_600,f_auto,q_auto"
+
+def image_path(code, suffix=""):
+    return f"{IMAGE_PREFIX}{API_IMAGE_TRANSFORM}/{code}{suffix}.jpg"
+
+def listing_codes(category_path, start, total_products, step=STEP, newest_first=False):
+    # newest_first : les produits ajoutés (total_products qui augmente) apparaissent en tête
+    for position in range(start, min(start + step, total_products)):
+        index = total_products - 1 - position if newest_first else position
+        yield f"{category_path.strip('/').replace('-', '')[:4].upper()}{index:05d}"
+
+def listing_html(category_path, start, total_products, step=STEP, newest_first=False, pagination=True):
+    # pagination=False : page sans barre de progression, le nombre de pages n'est plus lisible
+    page_count = (total_products + step - 1) // step
+    cards = []
+    for code in listing_codes(category_path, start, total_products, step, newest_first):
+        cards.append(
+            '<article class="product-grid_grid-item__KvZ2f">'
+            '<div class="product-card_product-card-content___bjeq">'
+            '<header data-testid="product-card-assets">'
+            f'<a href="/produit/{code}.html" aria-label="Produit {code}">'
+            '<div class="product-card-image_wrapper__hWdEw">'
+            f'<img src="{image_path(code)}" alt="Produit {code}" loading="lazy">'
+            f'<img src="{image_path(code, "_hover")}" alt="" class="product-card-image_hover" loading="lazy">'
+            '</div></a>'
+            '</header>'
+            '<div class="product-card-description_info__z_CcT">'
+            f'<p class="product-card-description_name__xHvJ2">Produit {code}</p>'
+            '<div class="gl-price"><span class="gl-price-item">100,00 €</span>'
+            '<span class="gl-price-item gl-price-item--sale">80,00 €</span></div>'
+            '</div>'
+            '</div>'
+            '</article>'
+        )
+    # Les vraies pages embarquent beaucoup de script et de navigation autour des cartes
+    filler = '<script>window.__STATE__ = {"noise": "' + "x" * 20000 + '"};</script>'
+    navigation = "".join(f'<li><a href="/nav-{n}">Rubrique {n}</a></li>' for n in range(200))
+    return (
+        f"<html><head><title>Listing</title>{filler}</head><body>"
+        f"<nav><ul>{navigation}</ul></nav>"
+        + (f'<div class="pagination_progress-bar__sWWOn" style="--page-count: {page_count};"></div>'
+           if pagination else "")
+        + "".join(cards)
+        + "</body></html>"
+    )
+
+def listing_json(category_path, start, total_products, step=STEP, newest_first=False, pagination=True):
+    # Forme de l'API de listing : mêmes produits que listing_html, avec les champs d'une vraie carte
+    items = [
+        {
+            "productId": code,
+            "modelId": code[:4] + "M",
+            "link": f"/produit/{code}.html",
+            "displayName": f"Produit {code}",
+            "division": "footwear",
+            "price": 100,
+            "salePrice": 80,
+            "image": {"src": image_path(code)},
+            "secondImage": {"src": image_path(code, "_hover")},
+            "colorVariations": [f"{code[:4]}{n:05d}" for n in range(3)],
+            "orderable": True,
+        }
+        for code in listing_codes(category_path, start, total_products, step, newest_first)
+    ]
+    item_list = {"count": total_products, "startIndex": start, "viewSize": step, "items": items}
+    if not pagination:
+        del item_list["count"]
+    return json.dumps({"raw": {"itemList": item_list}})
+
+def random_listing(rng):
+    # Variantes de balisage qu'un listing réel peut contenir : classes en plus, attributs dans
+    # un autre ordre, cartes sans header ou sans lien, entités dans les href, plusieurs liens
+    def card_classes():
+        classes = [listing.CARD_CLASS] + rng.sample(["is-new", "grid-item", "product-card_x"], rng.randint(0, 2))
+        rng.shuffle(classes)
+        return " ".join(classes)
+
+    def anchor(code):
+        href = rng.choice([f"/produit-{code}/{code}.html", f"/p/{code}.html?color=1&amp;size=2",
+                           f"/us/x-y/{code}.html"])
+        extra = rng.choice(["", ' data-href="/faux/LEURRE.html"', ' class="link" aria-label="x"'])
+        return f'<a{extra} href="{href}">{code}</a>'
+
+    parts = ['<html><body><div class="menu"><header><a href="/nav/ACCUEIL.html">nav</a></header></div>']
+    style = f"--page-count: {rng.randint(1, 60)};"
+    if rng.random() < 0.9:
+        attributes = [f'class="x {listing.PAGINATION_CLASS}"', f'style="color: red; {style}"']
+        rng.shuffle(attributes)
+        parts.append(f'<div {" ".join(attributes)}></div>')
+    for n in range(rng.randint(0, 60)):
+        code = f"C{n:04d}{rng.randint(0, 9)}"
+        kind = rng.random()
+        header = f'<header data-testid="{listing.CARD_HEADER_TESTID}">'
+        if kind < 0.6:
+            body = header + anchor(code) + "</header>"
+        elif kind < 0.7:
+            body = header + "<a>sans lien</a>" + anchor(code) + anchor(code + "B") + "</header>"
+        elif kind < 0.8:
+            body = header + "<span>pas de lien</span></header>" + header + anchor(code) + "</header>"
+        elif kind < 0.9:
+            body = '<header class="autre">' + anchor("AUTRE") + "</header>" + header + anchor(code) + "</header>"
+        else:
+            body = header + "<div><div>" + anchor(code) + "</div></div></header>"
+        parts.append(f'<article><div id="c{n}" class="{card_classes()}">{body}<p>{n}</p></div></article>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+LISTING_API_PATH = "/api/plp/content-engine"
+API_PREFIX = "/plp-app/api/product/"
+BATCH_API_PATH = "/plp-app/api/products"
+
+_image_bytes = {}
+
+def image_bytes(size=64, image_format="JPEG"):
+    # Bruit plutôt qu'aplat : taille de JPEG et coût de décodage proches d'une vraie photo
+    if (size, image_format) not in _image_bytes:
+        from PIL import Image
+        buffer = BytesIO()
+        Image.effect_noise((size, size), 40).convert("RGB").save(
+            buffer, format=image_format, quality=85 if image_format == "JPEG" else 80)
+        _image_bytes[size, image_format] = buffer.getvalue()
+    return _image_bytes[size, image_format]
+
+def image_rendition(path, original_size):
+    # w_ et f_webp du segment de transformation ; l'original (image_size) n'est jamais agrandi
+    parts = path[len(IMAGE_PREFIX):].split("/")
+    options = dict(option.split("_", 1) for option in parts[0].split(",") if "_" in option) if len(parts) > 1 else {}
+    size = min(int(options.get("w", original_size)), original_size)
+    return size, "WEBP" if options.get("f") == "webp" else "JPEG"
+
+def product_record(base_url, code):
+    return {
+        "id": code,
+        "title": f"Produit {code}",
+        "url": f"/produit/{code}.html",
+        "image": base_url + image_path(code),
+        "hoverImage": base_url + image_path(code, "_hover"),
+        "priceData": {"price": 100, "salePrice": 80},
+    }
+
+def product_json(base_url, code):
+    return json.dumps({"product": product_record(base_url, code)})
+
+def products_json(base_url, codes):
+    return json.dumps({"products": [product_record(base_url, code) for code in codes]})
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        if server.throttled():
+            body = b"Too Many Requests"
+            self.send_response(429)
+            self.send_header("Retry-After", str(server.retry_after))
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.write_body(body)
+            return
+        parsed = urlparse(self.path)
+        if parsed.path == BATCH_API_PATH:
+            time.sleep(server.latency)
+            codes = [code for code in parse_qs(parsed.query).get("ids", [""])[0].split(",") if code]
+            self.respond(products_json(server.base_url, codes).encode("utf-8"), "application/json")
+        elif parsed.path.startswith(API_PREFIX):
+            time.sleep(server.latency)
+            code = parsed.path[len(API_PREFIX):]
+            self.respond(product_json(server.base_url, code).encode("utf-8"), "application/json")
+        elif parsed.path.endswith(LISTING_API_PATH):
+            time.sleep(server.latency)
+            query = parse_qs(parsed.query)
+            start = int(query.get("start", ["0"])[0])
+            body = listing_json("/" + query["query"][0], start, server.total_products, server.page_size(query),
+                                newest_first=server.newest_first, pagination=server.pagination).encode("utf-8")
+            self.respond(body, "application/json")
+        elif parsed.path.startswith(IMAGE_PREFIX):
+            time.sleep(server.image_latency)
+            size, image_format = image_rendition(parsed.path, server.image_size)
+            self.respond(image_bytes(size, image_format), "image/" + image_format.lower())
+        else:
+            time.sleep(server.latency)
+            query = parse_qs(parsed.query)
+            start = int(query.get("start", ["0"])[0])
+            body = listing_html(parsed.path, start, server.total_products, server.page_size(query),
+                                newest_first=server.newest_first, pagination=server.pagination).encode("utf-8")
+            self.respond(body, "text/html; charset=utf-8")
+
+    def do_HEAD(self):
+        # Mêmes en-têtes que GET (Content-Length compris), sans le corps
+        self.do_GET()
+
+    def write_body(self, body):
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def respond(self, body, content_type, status=200):
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        bandwidth = self.server.bandwidth
+        if not bandwidth or self.command == "HEAD":
+            self.write_body(body)
+            return
+        # Débit limité : le corps arrive par morceaux, comme sur une vraie connexion
+        for offset in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + CHUNK_SIZE])
+            self.wfile.flush()
+            time.sleep(CHUNK_SIZE / bandwidth)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.05, total_products=480, image_latency=None, bandwidth=None, image_size=64,
+                 max_rate=None, retry_after=1, newest_first=False, pagination=True, max_page_size=STEP):
+        super().__init__(("127.0.0.1", 0), StandinHandler)
+        self.newest_first = newest_first
+        self.pagination = pagination
+        # sz= honoré jusqu'à max_page_size ; par défaut le serveur l'ignore et sert STEP produits
+        self.max_page_size = max_page_size
+        # Au-delà de max_rate req/s (fenêtre glissante d'une seconde) le serveur répond 429
+        self.max_rate = max_rate
+        self.retry_after = retry_after
+        self.recent = []
+        self.rate_lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+        self.image_size = image_size
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.image_latency = latency if image_latency is None else image_latency
+        self.total_products = total_products
+        self.thread = None
+
+    def handle_error(self, request, client_address):
+        # Client qui coupe la connexion en cours de corps (taille lue dans les en-têtes seulement)
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def page_size(self, query):
+        return min(int(query.get("sz", [STEP])[0]), max(self.max_page_size, STEP))
+
+    def throttled(self):
+        with self.rate_lock:
+            if self.max_rate is None:
+                self.served += 1
+                return False
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if now - t < 1.0]
+            if len(self.recent) >= self.max_rate:
+                self.rejected += 1
+                return True
+            self.recent.append(now)
+            self.served += 1
+            return False
+
+    @property
+    def base_url(self):
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+class ReplayHandler(StandinHandler):
+    def do_GET(self):
+        server = self.server
+        delay, error = server.draw()
+        time.sleep(delay)
+        if error:
+            if not server.error_status:
+                # Connexion coupée sans réponse : le client voit une ConnectionError
+                self.close_connection = True
+                return
+            body = b"Injected error"
+            self.send_response(server.error_status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.write_body(body)
+            return
+        entry = server.archive.lookup(server.origin + self.path)
+        if entry is None:
+            server.count(missing=1)
+            self.respond(b"Not recorded", "text/plain", 404)
+            return
+        self.respond(server.body(entry), entry["content_type"], entry["status"])
+
+class ReplayServer(StandinServer):
+    # Sert les réponses enregistrées d'une origine (fixtures.py) avec latence, gigue et erreurs
+    # injectées ; les URLs absolues des corps texte pointent vers les autres serveurs de rejeu
+    def __init__(self, archive, origin, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 bandwidth=None, seed=None):
+        super().__init__(latency, bandwidth=bandwidth)
+        self.RequestHandlerClass = ReplayHandler
+        self.archive = archive
+        self.origin = origin
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rewrites = []
+        self.random = random.Random(seed)
+        self.stats = {"requests": 0, "errors": 0, "missing": 0}
+
+    def count(self, **increments):
+        with self.rate_lock:
+            for key, value in increments.items():
+                self.stats[key] += value
+
+    def draw(self):
+        with self.rate_lock:
+            delay = max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0.0)
+            error = self.random.random() < self.error_rate
+            self.stats["requests"] += 1
+            self.stats["errors"] += error
+        return delay, error
+
+    def body(self, entry):
+        body = self.archive.body(entry)
+        if entry["content_type"].startswith(TEXT_TYPES):
+            for origin, base_url in self.rewrites:
+                body = body.replace(origin.encode(), base_url.encode())
+        return body
+
+def replay_servers(archive, seed=None, **options):
+    # Un serveur par origine enregistrée (www.adidas.fr, assets.adidas.com...)
+    servers = {origin: ReplayServer(archive, origin, seed=None if seed is None else seed + n, **options)
+               for n, origin in enumerate(archive.origins())}
+    # Origines les plus longues d'abord : l'une peut être le préfixe d'une autre
+    rewrites = sorted(((origin, server.base_url) for origin, server in servers.items()),
+                      key=lambda item: -len(item[0]))
+    for server in servers.values():
+        server.rewrites = rewrites
+    return servers
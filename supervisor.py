@@ -0,0 +1,112 @@
+import contextlib
+import importlib
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+
+from tqdm import tqdm
+
+import logs
+import metrics
+import transport
+
+DEFAULT_LOG_DIR = "logs"
+
+_queue = None
+_worker = None
+
+def report_total(total):
+    # Sans supervision ces appels ne font rien
+    if _queue is not None:
+        _queue.put(("total", _worker, total))
+
+def report_progress(count=1):
+    if _queue is not None:
+        _queue.put(("progress", _worker, count))
+
+def worker_main(module_name, function_name, name, kwargs, transport_options, log_options, events, log_path):
+    global _queue, _worker
+    _queue, _worker = events, name
+    # Chaque process a son propre pool de connexions et son propre limiteur
+    with open(log_path, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log), \
+         contextlib.redirect_stderr(log):
+        # Le journal du worker va dans son fichier logs/<nom>.log, pas dans --log-file
+        logs.setup(**dict(log_options, log_file=None))
+        started = time.perf_counter()
+        error = None
+        try:
+            session = transport.configure_options(transport_options)
+            getattr(importlib.import_module(module_name), function_name)(**kwargs)
+            session.print_stats()
+            stats = session.stats()
+        except Exception as e:
+            traceback.print_exc()
+            error, stats = repr(e), {}
+        logs.shutdown()
+    events.put(("done", name, {"elapsed": time.perf_counter() - started, "transport": stats, "error": error,
+                               "metrics": metrics.registry.snapshot()}))
+
+def run_workers(module_name, function_name, jobs, transport_options, log_dir=DEFAULT_LOG_DIR, log_options=None):
+    # jobs : liste de (nom, kwargs) ; un process par job, progression et stats fusionnées ici
+    os.makedirs(log_dir, exist_ok=True)
+    context = multiprocessing.get_context("spawn")
+    events = context.Queue()
+    processes = {}
+    bars = {}
+    for position, (name, kwargs) in enumerate(jobs):
+        log_path = os.path.join(log_dir, f"{name.replace('/', '_')}.log")
+        process = context.Process(
+            target=worker_main,
+            args=(module_name, function_name, name, kwargs, transport_options, log_options or logs.options(),
+                  events, log_path),
+            name=name,
+        )
+        process.start()
+        processes[name] = process
+        bars[name] = tqdm(desc=name, position=position, ncols=100, leave=True)
+    print(f"🧭 {len(jobs)} process lancés, journaux dans {log_dir}/")
+
+    results = {}
+    while len(results) < len(processes):
+        try:
+            kind, name, value = events.get(timeout=1)
+        except queue.Empty:
+            for name, process in processes.items():
+                if name not in results and not process.is_alive():
+                    results[name] = {"elapsed": 0.0, "transport": {},
+                                     "error": f"process terminé (code {process.exitcode})"}
+            continue
+        if kind == "total":
+            bars[name].total = value
+            bars[name].refresh()
+        elif kind == "progress":
+            bars[name].update(value)
+        elif kind == "done":
+            metrics.registry.merge(value.pop("metrics"), worker=name)
+            results[name] = value
+    for process in processes.values():
+        process.join()
+    for bar in bars.values():
+        bar.close()
+    print_summary(results)
+    return results
+
+def print_summary(results):
+    print(f"\n{'worker':<16} {'durée (s)':>10} {'requêtes':>9} {'connexions':>11} {'réutilisées':>12} {'essais':>7}")
+    totals = {"requests": 0, "new_connections": 0, "reused_connections": 0, "retried": 0}
+    for name, result in sorted(results.items()):
+        stats = result["transport"]
+        for key in totals:
+            totals[key] += stats.get(key, 0)
+        print(f"{name:<16} {result['elapsed']:>10.1f} {stats.get('requests', 0):>9} "
+              f"{stats.get('new_connections', 0):>11} {stats.get('reused_connections', 0):>12} "
+              f"{stats.get('retried', 0):>7}")
+        for host, host_stats in stats.get("hosts", {}).items():
+            print(f"  🚦 {host} : {host_stats['rate']} req/s, {host_stats['throttled']} throttlées")
+        if result["error"]:
+            print(f"  ❌ {result['error']}")
+    print(f"{'total':<16} {max((r['elapsed'] for r in results.values()), default=0):>10.1f} "
+          f"{totals['requests']:>9} {totals['new_connections']:>11} {totals['reused_connections']:>12} "
+          f"{totals['retried']:>7}")
@@ -0,0 +1,27 @@
+import pytest
+
+from checkpoint import Checkpoint
+
+def test_resume_keeps_states_within_the_same_scheme(tmp_path):
+    path = str(tmp_path / "checkpoint.sqlite")
+    journal = Checkpoint(path, reset=True, scope="fr")
+    journal.done("ABC123")
+    journal.close()
+    Checkpoint(path, per_country=True).close()
+    journal = Checkpoint(path, scope="fr")
+    assert journal.is_finished("ABC123")
+    journal.close()
+
+@pytest.mark.parametrize("written, resumed", [({"scope": "fr"}, {}), ({}, {"per_country": True})])
+def test_resume_across_schemes_is_refused(tmp_path, written, resumed):
+    path = str(tmp_path / "checkpoint.sqlite")
+    journal = Checkpoint(path, reset=True, **written)
+    journal.done("ABC123")
+    journal.close()
+    with pytest.raises(ValueError, match="reprise impossible"):
+        Checkpoint(path, **resumed)
+    # Sans --resume, le journal repart de zéro dans le nouveau mode
+    Checkpoint(path, reset=True, **resumed).close()
+    journal = Checkpoint(path, **resumed)
+    assert not journal.is_finished("ABC123")
+    journal.close()
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+import listing
+from standin import listing_html, random_listing
+
+# Pages du stand-in : avec et sans barre de pagination, page pleine, partielle et vide
+FIXTURE_PAGES = [
+    listing_html("/chaussures-hommes", 0, 480),
+    listing_html("/chaussures-hommes", 456, 480),
+    listing_html("/vetements-femmes", 0, 30, pagination=False),
+    listing_html("/accessoires-femmes", 96, 96),
+]
+
+def expected(html):
+    # Référence : get_max_pages + extract_links + link_code sur l'arbre BeautifulSoup complet
+    soup = BeautifulSoup(html, "html.parser")
+    return listing.get_max_pages(soup), [(link, listing.link_code(link)) for link in listing.extract_links(soup)]
+
+@pytest.mark.parametrize("parser", sorted(listing.PARSERS))
+@pytest.mark.parametrize("seed", range(200))
+def test_parser_matches_reference_on_random_pages(parser, seed):
+    html = random_listing(random.Random(seed))
+    assert listing.PARSERS[parser](html) == expected(html)
+
+@pytest.mark.parametrize("parser", sorted(listing.PARSERS))
+@pytest.mark.parametrize("page", range(len(FIXTURE_PAGES)))
+def test_parser_matches_reference_on_fixture_pages(parser, page):
+    html = FIXTURE_PAGES[page]
+    assert listing.PARSERS[parser](html) == expected(html)
@@ -0,0 +1,37 @@
+import contextlib
+import io
+
+import pytest
+
+import adidas
+import metrics
+import transport
+from bench import crawl_output, standin_url_map
+from standin import StandinServer
+
+PRODUCTS = 500
+
+def crawl_codes(server, tmp_path, mode, page_size):
+    metrics.reset()
+    transport.configure(pool_size=4)
+    output_dir = tmp_path / f"{mode}-{page_size}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        adidas.scrape_all(mode=mode, max_concurrency=4, delay=0, url_map=standin_url_map({"fr": server}),
+                          output_dir=str(output_dir), page_size=page_size)
+    # Les liens contiennent le port du serveur : seuls les codes sont comparés
+    return {path: text for path, text in crawl_output(output_dir).items() if path.name.endswith("_codes.txt")}
+
+@pytest.mark.parametrize("pagination", [True, False])
+@pytest.mark.parametrize("max_page_size", [48, 120, 240])
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_same_codes_at_every_page_size(tmp_path, mode, max_page_size, pagination):
+    # Le stand-in plafonne sz= à max_page_size : les offsets doivent suivre la taille servie
+    with StandinServer(0.0, PRODUCTS, pagination=pagination, max_page_size=max_page_size) as server:
+        reference = crawl_codes(server, tmp_path, mode, adidas.STEP)
+        assert len(reference) == 6
+        assert all(len(text.split()) == PRODUCTS for text in reference.values())
+        for page_size in (96, adidas.MAX_PAGE_SIZE):
+            assert crawl_codes(server, tmp_path, mode, page_size) == reference
+            short_pages = [entry for entry in metrics.registry.summary()["counters"]
+                           if entry["name"] == "short_pages"]
+            assert not short_pages
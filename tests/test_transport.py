@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import adidas
+import metrics
+import transport
+from standin import StandinHandler, StandinServer
+
+class FlakyHandler(StandinHandler):
+    # Les `failures` premières requêtes de chaque chemin échouent : statut HTTP, connexion
+    # coupée (status 0), réponse trop lente pour le timeout du client (status -1) ou corps
+    # coupé après les en-têtes (status -2)
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            seen = server.seen[self.path] = server.seen.get(self.path, 0) + 1
+        if seen > server.failures:
+            return super().do_GET()
+        if server.status == 0:
+            self.close_connection = True
+            self.connection.close()
+        elif server.status == -1:
+            time.sleep(0.5)
+            super().do_GET()
+        elif server.status == -2:
+            self.send_response(200)
+            self.send_header("Content-Length", "1000")
+            self.end_headers()
+            self.wfile.write(b"<html>")
+            self.close_connection = True
+        else:
+            body = b"erreur"
+            self.send_response(server.status)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+def flaky_server(status, failures):
+    server = StandinServer(0.0)
+    server.RequestHandlerClass = FlakyHandler
+    server.lock, server.seen, server.status, server.failures = threading.Lock(), {}, status, failures
+    return server
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504, 0, -1])
+def test_transient_errors_are_retried(status):
+    with flaky_server(status, failures=2) as server:
+        session = transport.Transport(pool_size=2, dns_ttl=0, retries=3)
+        response = session.get(f"{server.base_url}/plp-app/api/product/ABC123", timeout=0.2)
+        assert response.status_code == 200
+        assert response.json()["product"]["id"] == "ABC123"
+        assert session.retried == 2
+        session.close()
+
+def test_last_error_is_returned_once_retries_are_exhausted():
+    with flaky_server(500, failures=10) as server:
+        session = transport.Transport(pool_size=2, dns_ttl=0, retries=2)
+        assert session.get(f"{server.base_url}/plp-app/api/product/ABC123", timeout=1).status_code == 500
+        assert session.retried == 2
+        session.close()
+
+def test_connection_errors_raise_once_retries_are_exhausted():
+    with flaky_server(0, failures=10) as server:
+        session = transport.Transport(pool_size=2, dns_ttl=0, retries=1)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get(f"{server.base_url}/plp-app/api/product/ABC123", timeout=1)
+        assert session.retried == 1
+        session.close()
+
+def test_client_errors_are_not_retried():
+    with flaky_server(404, failures=1) as server:
+        session = transport.Transport(pool_size=2, dns_ttl=0, retries=3)
+        assert session.get(f"{server.base_url}/plp-app/api/product/ABC123", timeout=1).status_code == 404
+        assert session.retried == 0
+        session.close()
+
+def test_truncated_body_is_not_retried_by_the_transport():
+    with flaky_server(-2, failures=1) as server:
+        session = transport.Transport(pool_size=2, dns_ttl=0, retries=3)
+        with pytest.raises(requests.exceptions.ChunkedEncodingError):
+            session.get(f"{server.base_url}/plp-app/api/product/ABC123", timeout=1)
+        assert session.retried == 0
+        session.close()
+
+@pytest.mark.parametrize("status", [-2, 0])
+def test_listing_fetch_only_retries_truncated_bodies(status):
+    # Corps coupé : la page est redemandée ; connexion perdue : le transport a déjà retenté
+    with flaky_server(status, failures=2) as server:
+        transport.configure(pool_size=2, retries=1)
+        html = adidas.fetch_html(f"{server.base_url}/fr/femme-chaussures", backoff=0)
+        assert (html is not None) == (status == -2)
+        assert server.seen["/fr/femme-chaussures"] == (3 if status == -2 else 2)
+
+@pytest.mark.parametrize("dns_ttl", [0, 300])
+def test_name_resolution_is_timed_with_or_without_the_dns_cache(dns_ttl):
+    metrics.reset()
+    with StandinServer(0.0) as server:
+        session = transport.Transport(pool_size=1, dns_ttl=dns_ttl)
+        url = server.base_url.replace("127.0.0.1", "localhost")
+        assert session.get(f"{url}/plp-app/api/product/ABC123", timeout=1).status_code == 200
+        session.close()
+    phases = {h["phase"] for h in metrics.registry.summary()["histograms"] if h["name"] == "http_phase_seconds"}
+    assert {"dns", "connect"} <= phases
+
+def test_head_announces_the_length_without_a_body():
+    with StandinServer(0.0) as server:
+        session = transport.Transport(pool_size=1, dns_ttl=0)
+        url = f"{server.base_url}/images/ABC123_01.jpg"
+        head = session.head(url, timeout=1)
+        assert head.content == b""
+        assert int(head.headers["Content-Length"]) == len(session.get(url, timeout=1).content)
+        assert session.stats()["reused_connections"] == 1
+        session.close()
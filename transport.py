@@ -0,0 +1,446 @@
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+import logs
+import metrics
+import requests
+from fixtures import FixtureRecorder
+from http_cache import DEFAULT_CACHE_PATH, DEFAULT_TTLS, ResponseCache
+from ratelimit import RETRY_STATUSES, AdaptiveLimiter, backoff_delay
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+try:
+    import httpx
+except ImportError:  # HTTP/2 optionnel : nécessite httpx[http2]
+    httpx = None
+
+log = logs.get_logger("transport")
+
+DEFAULT_POOL_SIZE = 10
+# Cache DNS désactivé par défaut : il remplace socket.getaddrinfo pour tout le process
+DEFAULT_DNS_TTL = 0
+DEFAULT_RETRIES = 3
+# Erreurs réseau pendant la lecture du corps, relevées en ChunkedEncodingError : les appelants
+# les distinguent ainsi des échecs de la requête elle-même, déjà retentés par _send
+BODY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout) + \
+    ((httpx.TransportError,) if httpx is not None else ())
+
+class ConnectionCounter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def add_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def add_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+def connection_host(connection):
+    return connection.host if connection.port in (None, 80, 443) else f"{connection.host}:{connection.port}"
+
+def resolve(host, port):
+    # Adresses de host dans l'ordre de getaddrinfo (via le cache DNS s'il est installé)
+    infos = socket.getaddrinfo(host.strip("[]"), port, allowed_gai_family(), socket.SOCK_STREAM)
+    return list(dict.fromkeys(info[4][0] for info in infos))
+
+def counting_pool(base, counter):
+    # urllib3 rouvre parfois un objet connexion existant : on compte les connect() réels.
+    # _new_conn couvre la résolution DNS puis la connexion TCP, le reste de connect() le TLS
+    class CountingConnection(base.ConnectionCls):
+        def _new_conn(self):
+            host, dns_host = connection_host(self), self._dns_host
+            started = time.perf_counter()
+            try:
+                addresses = resolve(dns_host, self.port)
+            except socket.gaierror:
+                # urllib3 relève lui-même l'erreur de résolution habituelle
+                addresses = [dns_host]
+            self.dns_seconds = time.perf_counter() - started
+            metrics.observe("http_phase_seconds", self.dns_seconds, host=host, phase="dns")
+            # Adresses essayées dans l'ordre comme urllib3 ; _dns_host rétabli ensuite pour que le
+            # TLS et l'en-tête Host gardent le nom d'hôte
+            started = time.perf_counter()
+            try:
+                for address in addresses[:-1]:
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except ConnectTimeoutError:
+                        continue
+                self._dns_host = addresses[-1]
+                return super()._new_conn()
+            finally:
+                self._dns_host = dns_host
+                self.tcp_seconds = time.perf_counter() - started
+                metrics.observe("http_phase_seconds", self.tcp_seconds, host=host, phase="connect")
+
+        def connect(self):
+            counter.add_connection()
+            started = time.perf_counter()
+            self.dns_seconds = self.tcp_seconds = 0.0
+            result = super().connect()
+            if base.scheme == "https":
+                metrics.observe("http_phase_seconds",
+                                time.perf_counter() - started - self.dns_seconds - self.tcp_seconds,
+                                host=connection_host(self), phase="tls")
+            return result
+
+    class CountingPool(base):
+        ConnectionCls = CountingConnection
+    return CountingPool
+
+class CountingAdapter(HTTPAdapter):
+    # Compte les connexions réellement ouvertes par urllib3 pour en déduire les réutilisations
+    def __init__(self, counter, **kwargs):
+        self.counter = counter
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": counting_pool(HTTPConnectionPool, self.counter),
+            "https": counting_pool(HTTPSConnectionPool, self.counter),
+        }
+
+def is_address(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+class DNSCache:
+    # Mémorise getaddrinfo pendant `ttl` secondes ; urllib3 résout via socket.getaddrinfo
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.original = None
+
+    def getaddrinfo(self, *args, **kwargs):
+        if is_address(args[0] if args else kwargs.get("host")):
+            return self.original(*args, **kwargs)
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = self.original(*args, **kwargs)
+        with self.lock:
+            self.entries[key] = (now + self.ttl, result)
+        return result
+
+    def install(self):
+        if self.original is None:
+            self.original = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        if self.original is not None:
+            socket.getaddrinfo = self.original
+            self.original = None
+
+class Transport:
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, http2=False, dns_ttl=DEFAULT_DNS_TTL, cache_path=None,
+                 cache_ttls=None, limiter=None, retries=DEFAULT_RETRIES, record_dir=None):
+        self.pool_size = pool_size
+        self.limiter = limiter
+        self.retries = retries
+        self.retried = 0
+        self.cache = ResponseCache(cache_path, cache_ttls) if cache_path else None
+        self.recorder = FixtureRecorder(record_dir) if record_dir else None
+        self.counter = ConnectionCounter()
+        self.dns_cache = DNSCache(dns_ttl) if dns_ttl else None
+        if self.dns_cache:
+            self.dns_cache.install()
+
+        self.http2 = http2 and httpx is not None
+        if http2 and httpx is None:
+            log.warning("⚠️ httpx[http2] non installé, HTTP/1.1 keep-alive utilisé à la place")
+
+        if self.http2:
+            limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            self.client = httpx.Client(http2=True, limits=limits, follow_redirects=True)
+        else:
+            self.client = requests.Session()
+            adapter = CountingAdapter(self.counter, pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=pool_size)
+            self.client.mount("http://", adapter)
+            self.client.mount("https://", adapter)
+
+    def get(self, url, cache=None, **kwargs):
+        # cache : type de ressource ("listing", "product", "image") pour le cache disque
+        if cache is None or self.cache is None:
+            return self._get(url, **kwargs)
+        headers = kwargs.get("headers") or {}
+        response, conditional = self.cache.lookup(url, headers, cache)
+        if response is not None:
+            return response
+        kwargs["headers"] = dict(headers, **conditional)
+        response = self._get(url, **kwargs)
+        if response.status_code == 304 and conditional:
+            return self.cache.touch(url, headers, cache)
+        self.cache.store(url, headers, cache, response.status_code, response.headers, response.content)
+        return response
+
+    def _get(self, url, **kwargs):
+        response = self._send(url, stream=True, **kwargs)
+        # Corps lu ici plutôt que par requests/httpx pour en mesurer la durée et la taille
+        started = time.perf_counter()
+        try:
+            if self.http2:
+                response.read()
+            else:
+                response.content
+        except BODY_ERRORS as e:
+            raise requests.exceptions.ChunkedEncodingError(str(e)) from e
+        finally:
+            self.record_body(url, response, time.perf_counter() - started)
+        self.record_fixture(url, response.status_code, response.headers, response.content)
+        return response
+
+    def record_fixture(self, url, status, headers, body):
+        # Les 429/5xx sont passagers : on ne garde que les réponses qu'un rejeu doit reproduire
+        if self.recorder and status not in RETRY_STATUSES:
+            self.recorder.record(url, status, headers, body)
+
+    def record_body(self, url, response, seconds):
+        host = urlsplit(url).netloc
+        metrics.observe("http_phase_seconds", seconds, host=host, phase="body")
+        if self.http2:
+            size = response.num_bytes_downloaded
+        else:
+            size = response.raw.tell() if response.raw is not None else len(response.content)
+        metrics.count("http_bytes", size, host=host)
+
+    def head(self, url, **kwargs):
+        # En-têtes seuls (Content-Length...) : pas de corps à lire ni à mesurer
+        response = self._send(url, stream=False, method="HEAD", **kwargs)
+        response.close()
+        return response
+
+    def _send(self, url, stream, method="GET", **kwargs):
+        # Passe par le limiteur de l'hôte et retente les 429/5xx, timeouts et erreurs de connexion
+        # avec le même backoff exponentiel à jitter (Retry-After respecté)
+        host = urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            if self.limiter:
+                self.limiter.acquire(host)
+            self.counter.add_request()
+            started = time.perf_counter()
+            try:
+                response = self._open(url, stream, method, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                metrics.count("http_errors", host=host, error=type(e).__name__)
+                if self.limiter:
+                    self.limiter.on_throttle(host)
+                if attempt == self.retries:
+                    raise
+                delay = backoff_delay(attempt)
+                self.retried += 1
+                metrics.count("http_retries", host=host)
+                log.warning("🚦 %s sur %s, nouvel essai dans %.1fs", type(e).__name__, url, delay)
+                time.sleep(delay)
+                continue
+            latency = time.perf_counter() - started
+            # Réponse ouverte en streaming : la latence va jusqu'aux en-têtes (TTFB)
+            metrics.observe("http_phase_seconds", latency, host=host, phase="ttfb")
+            metrics.count("http_responses", host=host, status=str(response.status_code))
+            if response.status_code not in RETRY_STATUSES:
+                if self.limiter:
+                    self.limiter.on_success(host, latency)
+                return response
+            if self.limiter:
+                self.limiter.on_throttle(host)
+            if attempt == self.retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+            response.close()
+            self.retried += 1
+            metrics.count("http_retries", host=host)
+            log.warning("🚦 HTTP %s sur %s, nouvel essai dans %.1fs", response.status_code, url, delay)
+            time.sleep(delay)
+
+    def _open(self, url, stream, method="GET", **kwargs):
+        if not self.http2:
+            return self.client.request(method, url, stream=stream, **kwargs)
+        # Les appelants attendent les exceptions de requests
+        try:
+            request = self.client.build_request(method, url, headers=kwargs.get("headers"),
+                                                timeout=kwargs.get("timeout"))
+            return self.client.send(request, stream=stream)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ReadTimeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    def stream(self, url, chunk_size=16384, encoding=None, cache=None, status=None, **kwargs):
+        # Générateur des morceaux du corps au fil de la réception : texte décodé si encoding
+        # est donné, octets sinon. status reçoit le code et les en-têtes de la réponse
+        status = {} if status is None else status
+        if cache is None or self.cache is None:
+            yield from self._stream(url, chunk_size, encoding, status, **kwargs)
+            return
+        headers = kwargs.get("headers") or {}
+        response, conditional = self.cache.lookup(url, headers, cache)
+        if response is None:
+            kwargs["headers"] = dict(headers, **conditional)
+            parts = []
+            for chunk in self._stream(url, chunk_size, encoding, status, **kwargs):
+                if status["code"] == 304 and conditional:
+                    break
+                parts.append(chunk)
+                yield chunk
+            if status["code"] != 304 or not conditional:
+                body = "".join(parts).encode(encoding) if encoding else b"".join(parts)
+                self.cache.store(url, headers, cache, status["code"], status["headers"], body)
+                return
+            response = self.cache.touch(url, headers, cache)
+        status.update(code=response.status_code, headers=response.headers)
+        body = response.text if encoding else response.content
+        for offset in range(0, len(body), chunk_size):
+            yield body[offset:offset + chunk_size]
+
+    def stream_text(self, url, chunk_size=16384, encoding="utf-8", cache=None, **kwargs):
+        yield from self.stream(url, chunk_size, encoding, cache, **kwargs)
+
+    def _stream(self, url, chunk_size, encoding, status, **kwargs):
+        response = self._send(url, stream=True, **kwargs)
+        started = time.perf_counter()
+        try:
+            status.update(code=response.status_code, headers=response.headers)
+            if encoding:
+                response.encoding = encoding
+            if self.http2:
+                chunks = response.iter_text(chunk_size) if encoding else response.iter_bytes(chunk_size)
+            else:
+                chunks = response.iter_content(chunk_size, decode_unicode=bool(encoding))
+            parts = [] if self.recorder else None
+            for chunk in chunks:
+                if parts is not None:
+                    parts.append(chunk)
+                yield chunk
+            if parts is not None:
+                body = "".join(parts).encode(encoding) if encoding else b"".join(parts)
+                self.record_fixture(url, response.status_code, response.headers, body)
+        except BODY_ERRORS as e:
+            raise requests.exceptions.ChunkedEncodingError(str(e)) from e
+        finally:
+            self.record_body(url, response, time.perf_counter() - started)
+            response.close()
+
+    def stats(self):
+        stats = {"requests": self.counter.requests, "retried": self.retried, "http2": self.http2}
+        if self.limiter:
+            stats["hosts"] = self.limiter.stats()
+        if not self.http2:
+            stats["new_connections"] = self.counter.new_connections
+            stats["reused_connections"] = max(self.counter.requests - self.counter.new_connections, 0)
+        if self.dns_cache:
+            stats["dns_hits"] = self.dns_cache.hits
+            stats["dns_misses"] = self.dns_cache.misses
+        return stats
+
+    def print_stats(self):
+        stats = self.stats()
+        line = f"🔌 {stats['requests']} requêtes"
+        if "new_connections" in stats:
+            line += f", {stats['new_connections']} connexions ouvertes, {stats['reused_connections']} réutilisées"
+        else:
+            line += " (HTTP/2 multiplexé)"
+        if "dns_hits" in stats:
+            line += f", DNS {stats['dns_hits']} en cache / {stats['dns_misses']} résolutions"
+        if stats["retried"]:
+            line += f", {stats['retried']} nouveaux essais (429/5xx, erreurs réseau)"
+        print(line)
+        if self.limiter:
+            self.limiter.print_stats()
+        if self.cache:
+            self.cache.print_stats()
+        if self.recorder:
+            print(f"📼 {self.recorder.recorded} réponses enregistrées dans {self.recorder.root}")
+
+    def close(self):
+        self.client.close()
+        if self.cache:
+            self.cache.close()
+        if self.dns_cache:
+            self.dns_cache.uninstall()
+
+_transport = None
+_transport_lock = threading.Lock()
+
+def configure(**kwargs):
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = Transport(**kwargs)
+        return _transport
+
+def get_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
+
+def add_arguments(parser):
+    group = parser.add_argument_group("transport")
+    group.add_argument("--pool-size", type=int, default=None,
+                       help="connexions gardées ouvertes par hôte (défaut : nombre de workers réseau)")
+    group.add_argument("--http2", action="store_true", help="multiplexage HTTP/2 (nécessite httpx[http2])")
+    group.add_argument("--cache", action="store_true",
+                       help="cache disque des réponses avec revalidation ETag/Last-Modified")
+    group.add_argument("--cache-path", default=DEFAULT_CACHE_PATH)
+    for kind, ttl in DEFAULT_TTLS.items():
+        group.add_argument(f"--ttl-{kind}", type=int, default=ttl, help=f"durée de fraîcheur {kind} (secondes)")
+    group.add_argument("--dns-ttl", type=int, default=DEFAULT_DNS_TTL,
+                       help="garde les résolutions DNS N secondes (0 : désactivé) ; remplace socket.getaddrinfo "
+                            "pour tout le process, autres bibliothèques comprises")
+    group.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                       help="nouveaux essais sur 429/5xx, timeout ou connexion coupée, après Retry-After ou un "
+                            "backoff exponentiel à jitter")
+    group.add_argument("--adaptive-rate", action="store_true",
+                       help="limiteur par hôte qui accélère tant que le site répond bien et freine sur 429/5xx "
+                            "(à combiner avec --delay 0)")
+    group.add_argument("--initial-rate", type=float, default=2.0, help="débit de départ par hôte (req/s)")
+    group.add_argument("--max-rate", type=float, default=50.0, help="débit maximum par hôte (req/s)")
+    group.add_argument("--record-fixtures", metavar="DIR", default=None,
+                       help="enregistre chaque réponse reçue dans une archive de fixtures rejouable par "
+                            "bench.py replay (les réponses servies par --cache ne sont pas enregistrées)")
+
+def options_from_args(args, default_pool_size):
+    # Options sérialisables : un process worker reconstruit son propre transport avec
+    return {
+        "pool_size": args.pool_size or default_pool_size,
+        "http2": args.http2,
+        "dns_ttl": args.dns_ttl,
+        "cache_path": args.cache_path if args.cache else None,
+        "cache_ttls": {kind: getattr(args, f"ttl_{kind}") for kind in DEFAULT_TTLS},
+        "adaptive_rate": {"initial_rate": args.initial_rate, "max_rate": args.max_rate} if args.adaptive_rate else None,
+        "retries": args.retries,
+        "record_dir": args.record_fixtures,
+    }
+
+def configure_options(options):
+    options = dict(options)
+    adaptive_rate = options.pop("adaptive_rate", None)
+    return configure(limiter=AdaptiveLimiter(**adaptive_rate) if adaptive_rate else None, **options)
+
+def configure_from_args(args, default_pool_size):
+    return configure_options(options_from_args(args, default_pool_size))
@@ -0,0 +1,109 @@
+import atexit
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+DEFAULT_MAX_LINES = 1000
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+class BufferedWriter:
+    # Les lignes restent en mémoire et partent par lots (un write en O_APPEND puis fsync) :
+    # une coupure ne perd que le lot en cours, jamais une ligne coupée au milieu du fichier
+    def __init__(self, path, max_lines=DEFAULT_MAX_LINES, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.lines = []
+        # RLock : le handler de signal peut vider le tampon pendant un write du thread principal
+        self.lock = threading.RLock()
+        self.last_flush = time.monotonic()
+        self.written = 0
+        self.flushes = 0
+
+    def write(self, line):
+        self.write_lines([line])
+
+    def write_lines(self, lines):
+        with self.lock:
+            self.lines.extend(lines)
+            if len(self.lines) >= self.max_lines or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def flush_if_stale(self):
+        with self.lock:
+            if self.lines and time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def _flush(self):
+        self.last_flush = time.monotonic()
+        lines, self.lines = self.lines, []
+        if not lines:
+            return
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        self.written += len(lines)
+        self.flushes += 1
+
+class JsonlWriter(BufferedWriter):
+    def write_record(self, record):
+        self.write(json.dumps(record, ensure_ascii=False))
+
+_writers = {}
+_writers_lock = threading.Lock()
+_flusher = None
+
+def _flush_loop():
+    # Vidage périodique même quand plus rien n'est écrit
+    while True:
+        time.sleep(1.0)
+        for writer in list(_writers.values()):
+            writer.flush_if_stale()
+
+def get_writer(path, writer_class=BufferedWriter, **kwargs):
+    # Un writer par chemin, partagé entre threads
+    global _flusher
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = writer_class(path, **kwargs)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="writers-flush", daemon=True)
+            _flusher.start()
+        return writer
+
+def flush_all():
+    for writer in list(_writers.values()):
+        writer.flush()
+
+def close_all():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.flush()
+    return writers
+
+def install_signal_handlers():
+    # SIGTERM ne passe pas par atexit : on vide les tampons puis on sort proprement
+    def handle(signum, frame):
+        flush_all()
+        sys.exit(128 + signum)
+    signal.signal(signal.SIGTERM, handle)
+
+atexit.register(flush_all)